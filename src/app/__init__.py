@@ -1,7 +1,8 @@
 import os
 
-from flask import render_template, send_from_directory, url_for
+from flask import render_template
 
+from .extensions import Compressor
 from .factory import create_app
 
 app = create_app(os.getenv('FLASK_ENV', 'development'))
@@ -9,9 +10,7 @@ app = create_app(os.getenv('FLASK_ENV', 'development'))
 
 @app.route('/favicon.ico')
 def favicon():
-    return send_from_directory(os.path.join(app.root_path, 'static'),
-                               'favicon.ico',
-                               mimetype='image/vnd.microsoft.icon')
+    return Compressor.send_static('favicon.ico')
 
 
 @app.route("/")
@@ -1,12 +1,31 @@
-from flask_cors import CORS
-from flask_jwt_extended import JWTManager
-from flask_marshmallow import Marshmallow
-from flask_migrate import Migrate
-from flask_sqlalchemy import SQLAlchemy
+import importlib
+import threading
+
 from sqlalchemy.schema import MetaData
 
+from src.app.extensions.flask_admission_control import \
+    AdmissionControl as AdmissionControlClass
+from src.app.extensions.flask_compressor import \
+    Compressor as CompressorClass
 from src.app.extensions.flask_exception_handler import \
     ExceptionHandler as ExceptionHandlerClass
+from src.app.extensions.flask_json_encoder import \
+    JsonEncoder as JsonEncoderClass
+from src.app.extensions.flask_metrics import \
+    Metrics as MetricsClass
+from src.app.extensions.flask_pool_manager import \
+    PoolManager as PoolManagerClass
+from src.app.extensions.flask_query_cache import \
+    QueryCache as QueryCacheClass
+from src.app.extensions.flask_query_tracker import \
+    QueryTracker as QueryTrackerClass
+from src.app.extensions.flask_replica_router import \
+    ReplicaRouter as ReplicaRouterClass
+from src.app.extensions.flask_replica_router import RoutingSQLAlchemy
+from src.app.extensions.flask_request_logger import \
+    RequestLogger as RequestLoggerClass
+from src.app.extensions.flask_request_profiler import \
+    RequestProfiler as RequestProfilerClass
 from src.app.extensions.flask_response_manager import \
     ResponseManager as ResponseManagerClass
 from src.app.extensions.flask_schema_manager import \
@@ -24,16 +43,45 @@ metadata = MetaData(
         'pk': 'pk_%(table_name)s'
     })
 
-db = SQLAlchemy(metadata=metadata)
-migrate = Migrate()
-cors = CORS()
+db = RoutingSQLAlchemy(metadata=metadata)
 validator = ValidatorEngine()
 ExceptionHandler = ExceptionHandlerClass()
-ma = Marshmallow()
-jwt = JWTManager()
+AdmissionControl = AdmissionControlClass()
 ResponseManager = ResponseManagerClass()
 SchemaManager = SchemaManagerClass()
 SerializerManager = SerializerManagerClass()
+JsonEncoder = JsonEncoderClass()
+Compressor = CompressorClass()
+QueryCache = QueryCacheClass()
+PoolManager = PoolManagerClass()
+ReplicaRouter = ReplicaRouterClass()
+QueryTracker = QueryTrackerClass()
+RequestLogger = RequestLoggerClass()
+Metrics = MetricsClass()
+RequestProfiler = RequestProfilerClass()
+
+# Extensions the serving path does not register, imported on first access
+LAZY_EXTENSIONS = {
+    'migrate': ('flask_migrate', 'Migrate'),
+    'cors': ('flask_cors', 'CORS'),
+    'ma': ('flask_marshmallow', 'Marshmallow'),
+    'jwt': ('flask_jwt_extended', 'JWTManager'),
+}
+
+_lazy_lock = threading.Lock()
+
+
+def __getattr__(name: str):
+    if name not in LAZY_EXTENSIONS:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+    with _lazy_lock:
+        if name not in globals():
+            module_name, class_name = LAZY_EXTENSIONS[name]
+            extension_class = getattr(importlib.import_module(module_name), class_name)
+            globals()[name] = extension_class()
+
+    return globals()[name]
 
 
 def register_extensions(app: 'Flask') -> None:
@@ -42,3 +90,20 @@ def register_extensions(app: 'Flask') -> None:
     Args:
         app (Flask): Flask application instance
     """
+    JsonEncoder.init_app(app)
+    Compressor.init_app(app)
+    QueryCache.init_app(app)
+    PoolManager.init_app(app)
+    ReplicaRouter.init_app(app)
+    QueryTracker.init_app(app)
+    RequestLogger.init_app(app)
+    Metrics.init_app(app)
+
+    # After Metrics and RequestLogger, so shed requests are counted and logged as 503
+    AdmissionControl.init_app(app)
+
+    # Signed tokens (profiling, cursors) need the secret key of the environment
+    if app.config.get('SECRET_KEY') and app.config.get('SECRET_KEY_SALT'):
+        SerializerManager.init_app(app)
+
+    RequestProfiler.init_app(app)
@@ -0,0 +1,168 @@
+import threading
+import time
+from http import HTTPStatus
+
+from flask import g, request
+
+from src.app.extensions.flask_response_manager import \
+    EXTENSION_NAME as RESPONSE_MANAGER_EXTENSION_NAME
+from src.app.extensions.flask_response_manager import ResponseManager
+
+EXTENSION_NAME = 'flask-admission-control'
+
+# Header the proxy sets when it receives the request, e.g. nginx:
+# proxy_set_header X-Request-Start "t=${msec}";
+REQUEST_START_HEADER = 'X-Request-Start'
+
+ADMISSION_QUEUE_DEADLINE = 10.0
+
+ADMISSION_RETRY_AFTER = 1
+
+# Share of the queue deadline and of the in flight limit a priority class is admitted
+# within, None is never shed
+ADMISSION_PRIORITY_CLASSES = {
+    'critical': None,
+    'normal': 1.0,
+    'low': 0.5,
+}
+
+ADMISSION_DEFAULT_PRIORITY = 'normal'
+
+# Priority class by endpoint name, ADMISSION_ROUTE_PRIORITIES is merged into it
+ADMISSION_ROUTE_PRIORITIES = {
+    'metrics': 'critical',
+    'diagnostics_errors': 'critical',
+}
+
+
+def request_start(value: str):
+    """Epoch seconds of an X-Request-Start value.
+
+    Proxies send seconds (nginx `t=${msec}`), milliseconds or microseconds, with or without
+    the `t=` prefix; the unit is told apart by the magnitude.
+
+    :param value: The header value.
+    :returns: The timestamp in seconds or None when it can not be parsed.
+    """
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.startswith('t='):
+        value = value[len('t='):]
+
+    try:
+        timestamp = float(value)
+    except ValueError:
+        return None
+
+    if timestamp > 1e15:
+        return timestamp / 1e6
+    if timestamp > 1e12:
+        return timestamp / 1e3
+    return timestamp
+
+
+class AdmissionControl(object):
+    """Load shedding of the requests a worker can not serve in time.
+
+    Requests that already waited ADMISSION_QUEUE_DEADLINE seconds since the proxy received them
+    (X-Request-Start), and requests over ADMISSION_MAX_IN_FLIGHT concurrent requests of the
+    worker, are answered right away with a 503 and a Retry-After header instead of doing work
+    whose response the client most likely stopped waiting for.
+
+    Endpoints get a priority class from ADMISSION_ROUTE_PRIORITIES: critical endpoints (health
+    checks, metrics) are never shed, low priority ones are shed at a share of the limits.
+
+    Sync workers serve one request at a time, the queue deadline is what sheds there. With
+    gthread workers Flask never sees more requests than threads, an in flight limit below the
+    threads keeps threads free for the critical endpoints.
+    """
+
+    def __init__(self, app=None):
+        self.queue_deadline = ADMISSION_QUEUE_DEADLINE
+        self.max_in_flight = 0
+        self.retry_after = ADMISSION_RETRY_AFTER
+        self.priority_classes = ADMISSION_PRIORITY_CLASSES
+        self.route_priorities = ADMISSION_ROUTE_PRIORITIES
+        self.response_manager = None
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed = {'queue_time': 0, 'in_flight': 0}
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: 'Flask'):
+        self.app = app
+        self.queue_deadline = app.config.get('ADMISSION_QUEUE_DEADLINE', ADMISSION_QUEUE_DEADLINE)
+        self.max_in_flight = app.config.get('ADMISSION_MAX_IN_FLIGHT', 0)
+        self.retry_after = app.config.get('ADMISSION_RETRY_AFTER', ADMISSION_RETRY_AFTER)
+        self.priority_classes = dict(ADMISSION_PRIORITY_CLASSES,
+                                     **app.config.get('ADMISSION_PRIORITY_CLASSES', {}))
+        self.route_priorities = dict(ADMISSION_ROUTE_PRIORITIES,
+                                     **app.config.get('ADMISSION_ROUTE_PRIORITIES', {}))
+        self.response_manager = app.extensions.get(RESPONSE_MANAGER_EXTENSION_NAME) \
+            or ResponseManager()
+
+        if not app.config.get('ADMISSION_CONTROL', True):
+            return
+
+        app.before_request(self.admit)
+        app.teardown_request(self.release)
+
+        app.extensions = getattr(app, "extensions", {})
+        app.extensions[EXTENSION_NAME] = self
+
+    def priority(self) -> str:
+        return self.route_priorities.get(request.endpoint, ADMISSION_DEFAULT_PRIORITY)
+
+    def admit(self):
+        """before_request hook answering the requests to shed, the others go on as usual."""
+        with self._lock:
+            self.in_flight += 1
+            in_flight = self.in_flight
+        g.admission_counted = True
+
+        share = self.priority_classes.get(self.priority(), 1.0)
+        if share is None:
+            return None
+
+        if self.queue_deadline:
+            started = request_start(request.headers.get(REQUEST_START_HEADER))
+            queued = max(time.time() - started, 0.0) if started is not None else 0.0
+            if queued > self.queue_deadline * share:
+                return self.reject('queue_time')
+
+        if self.max_in_flight and in_flight > max(int(self.max_in_flight * share), 1):
+            return self.reject('in_flight')
+
+        with self._lock:
+            self.admitted += 1
+        return None
+
+    def release(self, error=None):  # pylint: disable=unused-argument
+        if g.pop('admission_counted', None):
+            with self._lock:
+                self.in_flight -= 1
+
+    def reject(self, reason: str):
+        with self._lock:
+            self.shed[reason] += 1
+
+        response, code = self.response_manager.build_error({
+            'description': 'The server is overloaded, retry later',
+            'type': 'ServiceUnavailable',
+            'details': {'reason': reason},
+        }, HTTPStatus.SERVICE_UNAVAILABLE)
+        response.headers['Retry-After'] = str(self.retry_after)
+        return response, code
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'in_flight': self.in_flight,
+                'admitted': self.admitted,
+                'shed': dict(self.shed),
+            }
@@ -0,0 +1,238 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import zlib
+
+from flask import current_app, request
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+EXTENSION_NAME = 'flask-compressor'
+
+COMPRESS_MIN_SIZE = 500
+
+COMPRESS_MIMETYPES = {
+    'application/json': 6,
+    'application/x-ndjson': 6,
+    'text/html': 6,
+    'text/css': 6,
+    'text/plain': 6,
+    'application/javascript': 6,
+    'application/manifest+json': 9,
+    'image/svg+xml': 9,
+    'image/vnd.microsoft.icon': 9,
+    'image/x-icon': 9,
+}
+
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+STATIC_UNVERSIONED_MAX_AGE = 3600
+
+COMPRESS_STATIC_MAX_SIZE = 1024 * 1024
+
+# Compressed static copies are kept only when they save at least this ratio
+STATIC_MIN_SAVING = 0.9
+
+
+class StaticAsset(object):
+    """A static file kept in memory along with its compressed copies."""
+
+    __slots__ = ('body', 'mimetype', 'etag', 'encoded')
+
+    def __init__(self, body: bytes, mimetype: str, etag: str, encoded: dict):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = etag
+        self.encoded = encoded
+
+
+class Compressor(object):
+    """Negotiated response compression.
+
+    Responses whose mimetype is listed in COMPRESS_MIMETYPES (mapped to its compression level)
+    and whose body is at least COMPRESS_MIN_SIZE bytes are compressed with the best encoding
+    accepted by the client among zstd (when zstandard is installed), gzip and deflate.
+    Streamed responses are compressed chunk by chunk.
+
+    When COMPRESS_STATIC is enabled the static folder is read and compressed once at startup
+    and served from memory. Static urls built with url_for carry a content hash, so those
+    responses are cached as immutable.
+    """
+
+    def __init__(self, app=None):
+        self.encodings = available_encodings()
+        self.min_size = COMPRESS_MIN_SIZE
+        self.levels = COMPRESS_MIMETYPES
+        self.assets = {}
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: 'Flask'):
+        self.app = app
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', COMPRESS_MIN_SIZE)
+        self.levels = app.config.get('COMPRESS_MIMETYPES', COMPRESS_MIMETYPES)
+
+        app.after_request(self.compress)
+
+        if app.config.get('COMPRESS_STATIC', True) and app.static_folder:
+            self.assets = self.load_assets(
+                app.static_folder,
+                app.config.get('COMPRESS_STATIC_MAX_SIZE',
+                               COMPRESS_STATIC_MAX_SIZE))
+            app.view_functions['static'] = self.send_static
+
+            @app.url_defaults
+            def static_version(endpoint, values):  # pylint: disable=unused-variable
+                if endpoint == 'static' and 'v' not in values:
+                    asset = self.assets.get(values.get('filename'))
+                    if asset:
+                        values['v'] = asset.etag[:12]
+
+        app.extensions = getattr(app, "extensions", {})
+        app.extensions[EXTENSION_NAME] = self
+
+    def negotiate(self) -> str:
+        """Return the preferred encoding of the client among the available ones."""
+        return request.accept_encodings.best_match(self.encodings)
+
+    def compress(self, response):
+        """after_request hook compressing the response when it is worth it."""
+        if response.status_code < 200 or response.status_code in (204, 304) \
+                or response.direct_passthrough \
+                or 'Content-Encoding' in response.headers:
+            return response
+
+        level = self.levels.get(response.mimetype)
+        if level is None:
+            return response
+
+        if not response.is_streamed and \
+                (response.content_length or 0) < self.min_size:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = self.negotiate()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = compress_stream(response.response, encoding,
+                                                level)
+        else:
+            response.set_data(compress(response.get_data(), encoding, level))
+
+        response.headers['Content-Encoding'] = encoding
+
+        # The compressed body is not byte for byte the same, nginx does the same weakening
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+
+        return response
+
+    def load_assets(self, folder: str, max_size: int) -> dict:
+        """Read the files of the static folder up to max_size bytes precompressing the compressible ones."""
+        assets = {}
+
+        for root, _, filenames in os.walk(folder):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                if os.path.getsize(path) > max_size:
+                    continue
+
+                with open(path, 'rb') as file:
+                    body = file.read()
+
+                mimetype = mimetypes.guess_type(filename)[0] \
+                    or 'application/octet-stream'
+                if filename.endswith('.webmanifest'):
+                    mimetype = 'application/manifest+json'
+
+                encoded = {}
+                level = self.levels.get(mimetype)
+                if level is not None:
+                    for encoding in self.encodings:
+                        data = compress(body, encoding, 9)
+                        if len(data) < len(body) * STATIC_MIN_SAVING:
+                            encoded[encoding] = data
+
+                name = os.path.relpath(path, folder).replace(os.sep, '/')
+                etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+                assets[name] = StaticAsset(body, mimetype, etag, encoded)
+
+        return assets
+
+    def send_static(self, filename: str):
+        """Serve a static file from memory in the best encoding the client accepts,
+        files not loaded in memory are sent from disk."""
+        asset = self.assets.get(filename)
+        if asset is None:
+            return current_app.send_static_file(filename)
+
+        response = current_app.response_class(mimetype=asset.mimetype)
+
+        if request.args.get('v') == asset.etag[:12]:
+            response.cache_control.public = True
+            response.cache_control.max_age = current_app.config.get(
+                'STATIC_MAX_AGE', STATIC_MAX_AGE)
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.public = True
+            response.cache_control.max_age = current_app.config.get(
+                'STATIC_UNVERSIONED_MAX_AGE', STATIC_UNVERSIONED_MAX_AGE)
+
+        body = asset.body
+        if asset.encoded:
+            response.vary.add('Accept-Encoding')
+            encoding = request.accept_encodings.best_match(list(asset.encoded))
+            if encoding:
+                body = asset.encoded[encoding]
+                response.headers['Content-Encoding'] = encoding
+
+        response.set_etag(asset.etag, weak=body is not asset.body)
+        response.set_data(body)
+        return response.make_conditional(request.environ)
+
+
+def available_encodings() -> list:
+    """Encodings in order of preference, zstd only when zstandard is installed."""
+    if zstandard is None:
+        return ['gzip', 'deflate']
+    return ['zstd', 'gzip', 'deflate']
+
+
+def compress(data: bytes, encoding: str, level: int) -> bytes:
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    return zlib.compress(data, level)
+
+
+def compress_stream(chunks, encoding: str, level: int):
+    """Compress an iterable of chunks flushing after each one so clients receive data as it is produced."""
+    if encoding == 'zstd':
+        compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        flush_mode = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+    else:
+        # wbits 31 writes a gzip container, 15 a zlib one as http deflate expects
+        compressor = zlib.compressobj(level, zlib.DEFLATED,
+                                      31 if encoding == 'gzip' else 15)
+        flush_mode = zlib.Z_SYNC_FLUSH
+
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compressor.compress(chunk) + compressor.flush(flush_mode)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
@@ -1,13 +1,30 @@
 # pylint: disable=invalid-name
+import hmac
+import os
+import threading
+import time
 import traceback
+from collections import OrderedDict
 from http import HTTPStatus
 
 from flask import current_app, request
 from marshmallow.exceptions import ValidationError
 from werkzeug.exceptions import HTTPException
 
+from src.app.extensions.flask_json_encoder import json_encoder
+
 EXTENSION_NAME = "flask-exception-handler"
 
+# Tracebacks logged per fingerprint and window, later occurrences are only counted
+ERROR_TRACEBACK_LIMIT = 5
+
+ERROR_WINDOW = 60
+
+ERROR_FINGERPRINTS = 1000
+
+# Innermost frames of the traceback that are part of the fingerprint
+FINGERPRINT_FRAMES = 3
+
 
 def get_ip_address():
     """ Get the real ip address
@@ -21,15 +38,141 @@ def get_ip_address():
         return request.remote_addr  # For local development
 
 
+class ErrorAggregator(object):
+    """Occurrences of errors grouped by fingerprint over time windows.
+
+    record() tells whether an occurrence is within the limit of its window, so callers log
+    the first ones in full and only count the rest. The least recently seen fingerprints are
+    dropped past maxsize.
+    """
+
+    def __init__(self,
+                 limit: int = ERROR_TRACEBACK_LIMIT,
+                 window: float = ERROR_WINDOW,
+                 maxsize: int = ERROR_FINGERPRINTS):
+        self.limit = limit
+        self.window = window
+        self.maxsize = maxsize
+        self.errors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, key: str, status: int, message: str):
+        """Count an occurrence.
+        :returns: A (logged, suppressed) tuple, whether the occurrence is within the window
+            limit and how many occurrences the previous window suppressed.
+        """
+        now = time.time()
+
+        with self._lock:
+            entry = self.errors.get(key)
+            if entry is None:
+                entry = self.errors[key] = {
+                    'status': status,
+                    'count': 0,
+                    'suppressed': 0,
+                    'first_seen': now,
+                    'last_seen': now,
+                    'window_start': now,
+                    'window_count': 0,
+                    'message': message,
+                }
+                while len(self.errors) > self.maxsize:
+                    self.errors.popitem(last=False)
+            else:
+                self.errors.move_to_end(key)
+
+            suppressed = 0
+            if now - entry['window_start'] >= self.window:
+                suppressed = max(entry['window_count'] - self.limit, 0)
+                entry['window_start'] = now
+                entry['window_count'] = 0
+
+            entry['count'] += 1
+            entry['window_count'] += 1
+            entry['last_seen'] = now
+            entry['message'] = message
+
+            logged = entry['window_count'] <= self.limit
+            if not logged:
+                entry['suppressed'] += 1
+
+        return logged, suppressed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                key: {
+                    name: value
+                    for name, value in entry.items()
+                    if name not in ('window_start', 'window_count')
+                }
+                for key, entry in reversed(self.errors.items())
+            }
+
+    def clear(self):
+        with self._lock:
+            self.errors.clear()
+
+
+def error_status(error: Exception) -> int:
+    """HTTP status of an error: its numeric status_code or code, 500 otherwise.
+
+    The validator's ValidationError keeps its name in code and the status in status_code.
+    """
+    for status in (getattr(error, 'status_code', None), getattr(error, 'code', None)):
+        if isinstance(status, int) and not isinstance(status, bool):
+            return status
+        if isinstance(status, str) and status.isdigit():
+            return int(status)
+    return int(HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
+def fingerprint(error: Exception, frames: int = FINGERPRINT_FRAMES) -> str:
+    """Group key of an error: exception type, endpoint and innermost traceback frames."""
+    parts = [type(error).__name__, str(request.endpoint)]
+
+    if isinstance(error, HTTPException):
+        parts.append(str(error_status(error)))
+    else:
+        tb = error.__traceback__
+        stack = []
+        while tb is not None:
+            stack.append(tb.tb_frame.f_code)
+            stack = stack[-frames:]
+            tb = tb.tb_next
+        parts.extend(f'{os.path.basename(code.co_filename)}:{code.co_name}'
+                     for code in stack)
+
+    return '|'.join(parts)
+
+
 class ExceptionHandler(object):
+    """JSON error responses and rate limited error logs.
+
+    Client errors (4xx) are logged as a single line, server errors with their traceback. Both
+    are grouped by fingerprint and only the first ERROR_TRACEBACK_LIMIT occurrences of each one
+    per ERROR_WINDOW seconds are logged, the rest are counted. The counters are served as JSON
+    by /_diagnostics/errors when ERROR_DIAGNOSTICS_TOKEN is set, to requests sending it as a
+    bearer token.
+    """
 
     def __init__(self, app=None):
         self.app = app
+        self.aggregator = ErrorAggregator()
 
         if app is not None:
             self.init_app(app)
 
     def init_app(self, app):
+        self.aggregator = ErrorAggregator(
+            limit=app.config.get('ERROR_TRACEBACK_LIMIT', ERROR_TRACEBACK_LIMIT),
+            window=app.config.get('ERROR_WINDOW', ERROR_WINDOW),
+            maxsize=app.config.get('ERROR_FINGERPRINTS', ERROR_FINGERPRINTS))
+
+        if app.config.get('ERROR_DIAGNOSTICS_TOKEN'):
+            app.add_url_rule('/_diagnostics/errors',
+                             'diagnostics_errors',
+                             self.diagnostics)
 
         app.register_error_handler(
             ValidationError,
@@ -46,50 +189,19 @@ class ExceptionHandler(object):
             self.try_catch_all,
         )
 
-        @app.after_request
-        def log_request(response):
-
-            if app.config.get('FLASK_ENV') == 'production':
-                return response
-            if request.path == '/favicon.ico':
-                return response
-            elif request.path.startswith('/static'):
-                return response
-
-            payload = request.get_json()
-            args = dict(request.args)
-
-            log_params = [
-                ('method', f'[{request.method}] {request.path}'),
-                ('status', response.status_code),
-                ('params', args),
-            ]
-
-            if payload:
-                log_params.append(('payload', payload))
-
-            parts = []
-            for name, value in log_params:
-                parts.append(f"\n{name}={value}")
-            line = " ".join(parts)
-
-            app.logger.info(line)
-
-            return response
-
         app.extensions = getattr(app, "extensions", {})
         app.extensions[EXTENSION_NAME] = self
 
     def handle_validation_errors(self, error):
 
-        return {
+        return json_encoder().response({
             'data': None,
             'errors': {
                 'description': 'Validation errors',
                 'type': error.__class__.__name__,
                 'details': error.normalized_messages(),
             }
-        }, HTTPStatus.BAD_REQUEST
+        }), HTTPStatus.BAD_REQUEST
 
     def handle_custom_exceptions(self, error):
 
@@ -101,9 +213,13 @@ class ExceptionHandler(object):
         if hasattr(error, 'messages'):
             response['details'] = error.messages
 
-        current_app.logger.error(traceback.format_exc(2))
+        status = error_status(error)
+        self.log_error(error, status)
 
-        return {'data': None, 'errors': response}, error.code
+        return json_encoder().response({
+            'data': None,
+            'errors': response
+        }), status
 
     def try_catch_all(self, error):
 
@@ -112,9 +228,47 @@ class ExceptionHandler(object):
             'type': error.__class__.__name__,
         }
 
-        current_app.logger.error(traceback.format_exc(2))
+        self.log_error(error, HTTPStatus.INTERNAL_SERVER_ERROR)
 
-        return {
+        return json_encoder().response({
             'data': None,
             'errors': response
-        }, HTTPStatus.INTERNAL_SERVER_ERROR
+        }), HTTPStatus.INTERNAL_SERVER_ERROR
+
+    def log_error(self, error: Exception, status: int):
+        """Log an error unless its fingerprint already reached the limit of the window."""
+        message = str(error)
+        status = int(status)
+        key = fingerprint(error)
+        logged, suppressed = self.aggregator.record(key, status, message)
+
+        if suppressed:
+            current_app.logger.warning(
+                f'{suppressed} occurrences of {key} were not logged in the last window')
+        if not logged:
+            return
+
+        line = f'[{request.method}] {request.path} {status} {type(error).__name__}: {message}'
+        if status < HTTPStatus.INTERNAL_SERVER_ERROR:
+            current_app.logger.info(line)
+        else:
+            current_app.logger.error(
+                line + '\n' + ''.join(traceback.format_exception(
+                    type(error), error, error.__traceback__)))
+
+    def stats(self) -> dict:
+        return self.aggregator.stats()
+
+    def diagnostics(self):
+        token = current_app.config.get('ERROR_DIAGNOSTICS_TOKEN') or ''
+        authorization = request.headers.get('Authorization', '')
+        if not token or not hmac.compare_digest(authorization, f'Bearer {token}'):
+            return json_encoder().response({
+                'data': None,
+                'errors': {
+                    'description': 'Invalid diagnostics token',
+                    'type': 'Forbidden',
+                }
+            }), HTTPStatus.FORBIDDEN
+
+        return json_encoder().response({'data': self.stats(), 'errors': None})
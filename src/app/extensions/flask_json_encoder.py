@@ -0,0 +1,126 @@
+import dataclasses
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from uuid import UUID
+
+from flask import current_app
+from sqlalchemy.engine import Row
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+EXTENSION_NAME = 'flask-json-encoder'
+
+BACKENDS = ('auto', 'orjson', 'json')
+
+
+def default(obj):
+    """Convert the types json does not know about, both backends share it
+    so they produce the same output.
+    :param obj: An object the backend could not serialize.
+    :exception: TypeError: When the object type is not supported.
+    :returns: A serializable value.
+    """
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, (Decimal, UUID)):
+        return str(obj)
+    if isinstance(obj, Row):
+        return obj._asdict()
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class JSONEncoder(json.JSONEncoder):
+    """Stdlib encoder installed as app.json_encoder so jsonify and the dicts
+    returned by views serialize like JsonEncoder.dumps does."""
+
+    def default(self, o):
+        return default(o)
+
+
+class JsonEncoder(object):
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.sort_keys = False
+        self._orjson_option = None
+        self._json_encoder = None
+        self.configure('auto')
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: 'Flask'):
+        self.app = app
+        self.configure(app.config.get('JSON_ENCODER_BACKEND', 'auto'),
+                       sort_keys=app.config.get('JSON_SORT_KEYS', False))
+
+        app.json_encoder = JSONEncoder
+
+        app.extensions = getattr(app, "extensions", {})
+        app.extensions[EXTENSION_NAME] = self
+
+    def configure(self, backend: str, sort_keys: bool = False):
+        """Select the serializer used by dumps.
+        :param backend: 'orjson', 'json' or 'auto' to use orjson when it is installed.
+        :param sort_keys: Whether object keys are sorted.
+        :exception: Exception: When the backend is unknown or not installed.
+        """
+        if backend not in BACKENDS:
+            raise Exception(
+                f'JsonEncoderError - Unknown backend {backend}, expecting one of {BACKENDS}'
+            )
+
+        if backend == 'orjson' and orjson is None:
+            raise Exception(
+                'JsonEncoderError - orjson backend selected but it is not installed')
+
+        if backend == 'auto':
+            backend = 'json' if orjson is None else 'orjson'
+
+        self.backend = backend
+        self.sort_keys = sort_keys
+
+        if backend == 'orjson':
+            option = orjson.OPT_NON_STR_KEYS
+            if sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            self._orjson_option = option
+        else:
+            self._json_encoder = JSONEncoder(ensure_ascii=False,
+                                             separators=(',', ':'),
+                                             sort_keys=sort_keys)
+
+    def dumps(self, obj) -> bytes:
+        """Serialize an object into utf-8 json bytes.
+        :param obj: Any object supported by the backend or by default().
+        :returns: json bytes.
+        """
+        if self.backend == 'orjson':
+            return orjson.dumps(obj, default=default, option=self._orjson_option)
+
+        # The stdlib encoder can only produce str
+        return self._json_encoder.encode(obj).encode('utf-8')
+
+    def response(self, payload, status: int = None, headers: dict = None):
+        """Build a json response from the serialized payload bytes."""
+        return current_app.response_class(self.dumps(payload),
+                                          status=status,
+                                          headers=headers,
+                                          mimetype='application/json')
+
+
+def json_encoder() -> JsonEncoder:
+    """Return the encoder registered in the current app or the default one."""
+    return current_app.extensions.get(EXTENSION_NAME, DEFAULT_ENCODER)
+
+
+DEFAULT_ENCODER = JsonEncoder()
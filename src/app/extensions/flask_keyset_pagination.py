@@ -0,0 +1,202 @@
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
+
+from flask import current_app
+from itsdangerous.exc import BadData
+from sqlalchemy import tuple_
+from werkzeug.exceptions import BadRequest
+
+from src.app.extensions.flask_serializer_manager import \
+    EXTENSION_NAME as SERIALIZER_EXTENSION_NAME
+from src.app.extensions.lru_cache import LRUCache
+
+TOTAL_MODES = (None, 'exact', 'estimate', 'cached')
+
+CURSOR_EXPIRATION = 24 * 3600
+
+TOTAL_CACHE_TTL = 60
+
+TOTAL_CACHE_SIZE = 1024
+
+_total_cache = LRUCache(maxsize=TOTAL_CACHE_SIZE)
+
+
+class KeysetPagination(object):
+    """A page fetched with a keyset (seek) predicate instead of OFFSET.
+
+    Cursors are opaque signed tokens holding the sort key of the first or last row of the page,
+    so fetching any page costs one indexed range scan no matter how deep it is.
+    """
+
+    def __init__(self,
+                 items,
+                 per_page: int,
+                 next_cursor: str = None,
+                 prev_cursor: str = None,
+                 total: int = None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+
+def keyset_paginate(query,
+                    order_by,
+                    cursor: str = None,
+                    per_page: int = None,
+                    descending: bool = False,
+                    total: str = None,
+                    serializer=None) -> KeysetPagination:
+    """Fetch a page of a query after or before a cursor.
+
+    :param query: A SQLAlchemy query, its own ORDER BY is replaced.
+    :param order_by: Columns defining the order, the last one must be unique (e.g. the primary key).
+        They should be covered by an index in the same order.
+    :param cursor: A cursor returned by a previous page, None for the first page.
+    :param per_page: Page size, capped to SQLALCHEMY_DEFAULT_MAX_PER_PAGE.
+    :param descending: Whether the columns are sorted in descending order.
+    :param total: None to skip it, 'exact' to count, 'estimate' to use the planner
+        row estimate (PostgreSQL) or 'cached' for an exact count cached for KEYSET_TOTAL_CACHE_TTL seconds.
+    :param serializer: SerializerManager used to sign cursors, defaults to the one registered in the app.
+    :exception: werkzeug.exceptions.BadRequest: When the cursor is not valid.
+    :returns: A KeysetPagination.
+    """
+    if total not in TOTAL_MODES:
+        raise Exception(
+            f'KeysetPaginationError - Unknown total {total}, expecting one of {TOTAL_MODES}'
+        )
+
+    config = current_app.config
+    serializer = serializer or current_app.extensions[SERIALIZER_EXTENSION_NAME]
+    per_page = min(per_page or config.get('SQLALCHEMY_DEFAULT_PER_PAGE', 25),
+                   config.get('SQLALCHEMY_DEFAULT_MAX_PER_PAGE', 100))
+    columns = tuple(order_by)
+
+    page_total = count_total(query, total)
+
+    backwards = False
+    if cursor:
+        try:
+            payload = serializer.decode(
+                cursor,
+                expiration=config.get('KEYSET_CURSOR_EXPIRATION',
+                                      CURSOR_EXPIRATION))
+            backwards = payload['d'] == 'prev'
+            values = [load_key(value) for value in payload['k']]
+        except (BadData, KeyError, TypeError, ValueError):
+            raise BadRequest('Invalid pagination cursor') from None
+
+        if len(values) != len(columns):
+            raise BadRequest('Invalid pagination cursor')
+
+        # Moving forward in an ascending order, or backwards in a descending one, seeks greater keys
+        if backwards == descending:
+            query = query.filter(tuple_(*columns) > tuple_(*values))
+        else:
+            query = query.filter(tuple_(*columns) < tuple_(*values))
+
+    ascending = backwards == descending
+    query = query.order_by(None).order_by(
+        *[column.asc() if ascending else column.desc() for column in columns])
+
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    items = rows[:per_page]
+
+    def make_cursor(item, direction):
+        keys = [dump_key(getattr(item, column.key)) for column in columns]
+        return serializer.encode({'k': keys, 'd': direction})
+
+    next_cursor = prev_cursor = None
+    if backwards:
+        items.reverse()
+        if items:
+            next_cursor = make_cursor(items[-1], 'next')
+            if has_more:
+                prev_cursor = make_cursor(items[0], 'prev')
+    elif items:
+        if has_more:
+            next_cursor = make_cursor(items[-1], 'next')
+        if cursor:
+            prev_cursor = make_cursor(items[0], 'prev')
+
+    return KeysetPagination(items,
+                            per_page,
+                            next_cursor=next_cursor,
+                            prev_cursor=prev_cursor,
+                            total=page_total)
+
+
+def count_total(query, mode: str = None):
+    """Count the rows of a query according to the total mode of keyset_paginate."""
+    if mode is None:
+        return None
+
+    query = query.order_by(None)
+
+    if mode == 'exact':
+        return query.count()
+
+    if mode == 'estimate':
+        return estimate_total(query)
+
+    statement = query.statement.compile(
+        compile_kwargs={'render_postcompile': True})
+    key = (str(statement), repr(sorted(statement.params.items())))
+    value = _total_cache.get(key)
+
+    if value is None:
+        value = query.count()
+        _total_cache.set(key,
+                         value,
+                         ttl=current_app.config.get('KEYSET_TOTAL_CACHE_TTL',
+                                                    TOTAL_CACHE_TTL))
+
+    return value
+
+
+def estimate_total(query):
+    """Return the planner row estimate of a query, falling back to an exact count
+    on databases other than PostgreSQL."""
+    connection = query.session.connection()
+
+    if connection.dialect.name != 'postgresql':
+        return query.count()
+
+    statement = query.statement.compile(
+        dialect=connection.dialect,
+        compile_kwargs={'render_postcompile': True})
+    plan = connection.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {statement}',
+                                      statement.params).scalar()
+
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def dump_key(value):
+    """Convert a sort key into a json value, tagging the types json can not restore."""
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'n': str(value)}
+    if isinstance(value, UUID):
+        return {'u': str(value)}
+    return value
+
+
+def load_key(value):
+    """Restore a sort key converted with dump_key."""
+    if not isinstance(value, dict):
+        return value
+    if 'dt' in value:
+        return datetime.fromisoformat(value['dt'])
+    if 'd' in value:
+        return date.fromisoformat(value['d'])
+    if 'n' in value:
+        return Decimal(value['n'])
+    if 'u' in value:
+        return UUID(value['u'])
+    raise ValueError('Unknown cursor key')
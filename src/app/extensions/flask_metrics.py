@@ -0,0 +1,350 @@
+import bisect
+import fcntl
+import functools
+import glob
+import hmac
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from http import HTTPStatus
+
+from flask import current_app, g, request
+
+EXTENSION_NAME = 'flask-metrics'
+
+METRICS_DIR = os.path.join(tempfile.gettempdir(), 'flask-metrics')
+
+METRICS_ROUTE = '/metrics'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Samples of the dead workers are merged into this file so counters never go backwards
+ARCHIVE_FILE = 'archive.db'
+
+METRICS = {
+    'http_requests_total': ('counter', 'Requests by endpoint, method and status class.'),
+    'http_request_duration_seconds': ('histogram', 'Request latency by endpoint.'),
+    'http_requests_in_flight': ('gauge', 'Requests being handled by endpoint.'),
+}
+
+INITIAL_SIZE = 1024 * 1024
+
+# Entries are a uint32 key length, the utf-8 key padded to 8 bytes and a double
+HEADER = struct.Struct('i4x')
+KEY_LENGTH = struct.Struct('i')
+VALUE = struct.Struct('d')
+
+
+class MmapDict(object):
+    """{key: float} stored in a memory mapped file written by a single process.
+
+    Keys are appended and never removed, values are updated in place, so other processes can
+    read the file at any time without locking. Writes from the threads of the process are
+    serialized with a lock.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.positions = {}
+        self._lock = threading.Lock()
+
+        exists = os.path.exists(path)
+        self._file = open(path, 'a+b')  # pylint: disable=consider-using-with
+        if not exists or os.path.getsize(path) < HEADER.size:
+            self._file.truncate(INITIAL_SIZE)
+        self._capacity = os.path.getsize(path)
+        self._mmap = mmap.mmap(self._file.fileno(), self._capacity)
+
+        self.used = HEADER.unpack_from(self._mmap, 0)[0] or HEADER.size
+        for key, value, position in read_entries(self._mmap, self.used):  # pylint: disable=unused-variable
+            self.positions[key] = position
+
+    def _append(self, key: str) -> int:
+        encoded = key.encode('utf-8')
+        padded = KEY_LENGTH.size + len(encoded)
+        padded += (8 - padded % 8) % 8
+        size = padded + VALUE.size
+
+        if self.used + size > self._capacity:
+            while self.used + size > self._capacity:
+                self._capacity *= 2
+            self._mmap.close()
+            self._file.truncate(self._capacity)
+            self._mmap = mmap.mmap(self._file.fileno(), self._capacity)
+
+        KEY_LENGTH.pack_into(self._mmap, self.used, len(encoded))
+        self._mmap[self.used + KEY_LENGTH.size:self.used + KEY_LENGTH.size + len(encoded)] = encoded
+        position = self.used + padded
+        VALUE.pack_into(self._mmap, position, 0.0)
+
+        # The entry is complete before readers can see it
+        self.used += size
+        HEADER.pack_into(self._mmap, 0, self.used)
+        self.positions[key] = position
+        return position
+
+    def add(self, key: str, amount: float = 1.0):
+        with self._lock:
+            position = self.positions.get(key)
+            if position is None:
+                position = self._append(key)
+            value = VALUE.unpack_from(self._mmap, position)[0]
+            VALUE.pack_into(self._mmap, position, value + amount)
+
+    def items(self) -> dict:
+        with self._lock:
+            return {key: value for key, value, _ in read_entries(self._mmap, self.used)}
+
+    def close(self):
+        with self._lock:
+            self._mmap.close()
+            self._file.close()
+
+
+def read_entries(buffer, used: int = None):
+    """Yield the (key, value, value position) entries of a MmapDict buffer."""
+    if used is None:
+        used = HEADER.unpack_from(buffer, 0)[0] if len(buffer) >= HEADER.size else 0
+
+    position = HEADER.size
+    while position < used:
+        length = KEY_LENGTH.unpack_from(buffer, position)[0]
+        key = bytes(buffer[position + KEY_LENGTH.size:position + KEY_LENGTH.size + length])
+        padded = KEY_LENGTH.size + length
+        padded += (8 - padded % 8) % 8
+        value_position = position + padded
+        yield key.decode('utf-8'), VALUE.unpack_from(buffer, value_position)[0], value_position
+        position = value_position + VALUE.size
+
+
+def read_file(path: str) -> dict:
+    try:
+        with open(path, 'rb') as file:
+            data = file.read()
+    except OSError:
+        return {}
+    return {key: value for key, value, _ in read_entries(data)}
+
+
+@functools.lru_cache(maxsize=4096)
+def sample_key(name: str, labels: tuple) -> str:
+    return json.dumps([name, labels])
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def mark_process_dead(pid: int, directory: str = METRICS_DIR):
+    """Merge the counters and histograms of a dead worker into the archive and remove its file.
+
+    Called from the gunicorn child_exit and worker_exit hooks, gauges of the worker are dropped.
+    """
+    path = os.path.join(directory, f'worker_{pid}.db')
+    if not os.path.exists(path):
+        return
+
+    with open(os.path.join(directory, 'archive.lock'), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if not os.path.exists(path):
+            return
+
+        archive = MmapDict(os.path.join(directory, ARCHIVE_FILE))
+        try:
+            for key, value in read_file(path).items():
+                name = json.loads(key)[0]
+                if METRICS.get(metric_name(name), ('gauge', ))[0] != 'gauge':
+                    archive.add(key, value)
+        finally:
+            archive.close()
+        os.remove(path)
+
+
+def clear(directory: str = METRICS_DIR):
+    """Remove the files of a previous run, call it before the workers start."""
+    for path in glob.glob(os.path.join(directory, '*.db')):
+        os.remove(path)
+
+
+def metric_name(sample: str) -> str:
+    for suffix in ('_bucket', '_sum', '_count'):
+        if sample.endswith(suffix) and sample[:-len(suffix)] in METRICS:
+            return sample[:-len(suffix)]
+    return sample
+
+
+def collect(directory: str = METRICS_DIR) -> dict:
+    """Sum the samples of every worker file and the archive.
+    :returns: {(sample name, labels): value}
+    """
+    samples = {}
+    for path in glob.glob(os.path.join(directory, '*.db')):
+        filename = os.path.basename(path)
+        live = True
+        if filename.startswith('worker_'):
+            live = pid_alive(int(filename[len('worker_'):-len('.db')]))
+
+        for key, value in read_file(path).items():
+            name, labels = json.loads(key)
+            if not live and METRICS.get(metric_name(name), ('gauge', ))[0] == 'gauge':
+                continue
+            labels = tuple(tuple(label) for label in labels)
+            samples[name, labels] = samples.get((name, labels), 0.0) + value
+
+    return samples
+
+
+def escape(value: str) -> str:
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def format_labels(labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels) + '}'
+
+
+def format_value(value: float) -> str:
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def exposition(samples: dict) -> str:
+    """Render samples in the Prometheus text format, histogram buckets made cumulative."""
+    lines = []
+    for metric, (kind, description) in METRICS.items():
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} {kind}')
+
+        if kind != 'histogram':
+            for (name, labels), value in sorted(samples.items()):
+                if name == metric:
+                    lines.append(f'{metric}{format_labels(labels)} {format_value(value)}')
+            continue
+
+        series = {}
+        for (name, labels), value in samples.items():
+            if name == f'{metric}_bucket':
+                le = dict(labels)['le']
+                other = tuple(label for label in labels if label[0] != 'le')
+                series.setdefault(other, {})[le] = value
+
+        for labels in sorted(series):
+            cumulative = 0.0
+            for bound in LATENCY_BUCKETS + (float('inf'), ):
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                cumulative += series[labels].get(le, 0.0)
+                lines.append(f'{metric}_bucket{format_labels(labels + (("le", le), ))} '
+                             f'{format_value(cumulative)}')
+            for suffix in ('_sum', '_count'):
+                value = samples.get((metric + suffix, labels), 0.0)
+                lines.append(f'{metric}{suffix}{format_labels(labels)} {format_value(value)}')
+
+    return '\n'.join(lines) + '\n'
+
+
+class Metrics(object):
+    """Request metrics shared by all the worker processes.
+
+    Each worker counts requests by endpoint, method and status class, observes their latency
+    in a histogram and tracks in flight requests in its own memory mapped file of METRICS_DIR.
+    METRICS_ROUTE sums the files of every worker in the Prometheus text format; in flight
+    gauges of dead workers are ignored and their counters are archived by the gunicorn hooks.
+    When METRICS_TOKEN is set the route requires it as a bearer token.
+
+    Endpoints, not paths, are used as labels so unmatched urls do not add series.
+    """
+
+    def __init__(self, app=None):
+        self.directory = METRICS_DIR
+        self._store = None
+        self.pid = None
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: 'Flask'):
+        self.app = app
+        self.directory = app.config.get('METRICS_DIR') or METRICS_DIR
+        os.makedirs(self.directory, exist_ok=True)
+
+        if not app.config.get('METRICS', True):
+            return
+
+        app.before_request(self.start)
+        app.after_request(self.observe)
+        app.teardown_request(self.finish)
+        app.add_url_rule(app.config.get('METRICS_ROUTE', METRICS_ROUTE), 'metrics',
+                         self.metrics)
+
+        app.extensions = getattr(app, "extensions", {})
+        app.extensions[EXTENSION_NAME] = self
+
+    @property
+    def store(self) -> MmapDict:
+        # A forked worker opens its own file
+        pid = os.getpid()
+        if self.pid != pid:
+            self._store = MmapDict(os.path.join(self.directory, f'worker_{pid}.db'))
+            self.pid = pid
+        return self._store
+
+    def start(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_endpoint = request.endpoint or 'unmatched'
+        self.store.add(
+            sample_key('http_requests_in_flight', (('endpoint', g.metrics_endpoint), )))
+
+    def observe(self, response):
+        started = g.get('metrics_started')
+        if started is None:
+            return response
+
+        elapsed = time.perf_counter() - started
+        endpoint = (('endpoint', g.metrics_endpoint), )
+        index = bisect.bisect_left(LATENCY_BUCKETS, elapsed)
+        le = repr(LATENCY_BUCKETS[index]) if index < len(LATENCY_BUCKETS) else '+Inf'
+
+        store = self.store
+        store.add(sample_key('http_requests_total', endpoint + (
+            ('method', request.method),
+            ('status', f'{response.status_code // 100}xx'),
+        )))
+        store.add(sample_key('http_request_duration_seconds_bucket', endpoint + (('le', le), )))
+        store.add(sample_key('http_request_duration_seconds_sum', endpoint), elapsed)
+        store.add(sample_key('http_request_duration_seconds_count', endpoint))
+
+        return response
+
+    def finish(self, error=None):  # pylint: disable=unused-argument
+        endpoint = g.pop('metrics_endpoint', None)
+        if endpoint is not None:
+            self.store.add(
+                sample_key('http_requests_in_flight', (('endpoint', endpoint), )), -1.0)
+
+    def collect(self) -> dict:
+        return collect(self.directory)
+
+    def mark_process_dead(self, pid: int):
+        mark_process_dead(pid, self.directory)
+
+    def clear(self):
+        clear(self.directory)
+
+    def metrics(self):
+        token = current_app.config.get('METRICS_TOKEN')
+        if token and not hmac.compare_digest(request.headers.get('Authorization', ''),
+                                             f'Bearer {token}'):
+            return 'Invalid metrics token\n', HTTPStatus.FORBIDDEN
+
+        return current_app.response_class(exposition(self.collect()),
+                                          mimetype='text/plain; version=0.0.4')
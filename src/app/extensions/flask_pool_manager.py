@@ -0,0 +1,215 @@
+import os
+import threading
+import time
+import weakref
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool, QueuePool
+
+EXTENSION_NAME = 'flask-pool-manager'
+
+DB_POOL_TIMEOUT = 10
+
+DB_POOL_RECYCLE = 1800
+
+# Connection record key holding the pid of the process that opened the connection
+PID_KEY = 'pool_manager_pid'
+
+
+class PoolStats(object):
+    """Counters of the connection pools of the process, shared by every engine."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.invalidated = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.connects = 0
+            self.checkouts = 0
+            self.timeouts = 0
+            self.invalidated = 0
+            self.waits = 0
+            self.wait_time = 0.0
+            self.max_wait_time = 0.0
+
+    def increment(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def waited(self, seconds: float):
+        with self._lock:
+            self.waits += 1
+            self.wait_time += seconds
+            self.max_wait_time = max(self.max_wait_time, seconds)
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                'connects': self.connects,
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'invalidated': self.invalidated,
+                'wait_time': round(self.wait_time, 6),
+                'max_wait_time': round(self.max_wait_time, 6),
+                'avg_wait_time':
+                round(self.wait_time / self.waits, 6) if self.waits else 0.0,
+            }
+
+
+POOL_STATS = PoolStats()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool recording how long checkouts wait for a connection and how many time out."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            POOL_STATS.increment('timeouts')
+            raise
+        finally:
+            POOL_STATS.waited(time.perf_counter() - start)
+
+
+class PoolManager(object):
+    """Connection pool sizing, fork safety and metrics of the SQLAlchemy engines.
+
+    The pool of each worker process is sized from the gunicorn threads, one connection per
+    thread, with overflow bounded by DB_MAX_CONNECTIONS shared by all the workers. Options set
+    in SQLALCHEMY_ENGINE_OPTIONS take precedence, SQLite urls are left untouched.
+
+    Connections remember the pid that opened them and are discarded, never closed, when checked
+    out in another process, so a worker forked from a preloaded app can not reuse the sockets
+    of its parent. The gunicorn pre_fork hook also disposes the master pools.
+    """
+
+    def __init__(self, app=None):
+        self.counters = POOL_STATS
+        self.engines = weakref.WeakSet()
+        self.pid = os.getpid()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: 'Flask'):
+        self.app = app
+
+        uri = app.config.get('SQLALCHEMY_DATABASE_URI')
+        if uri and not uri.startswith('sqlite'):
+            options = pool_options(
+                workers=app.config.get('WEB_CONCURRENCY', 1),
+                threads=app.config.get('PYTHON_MAX_THREADS', 1),
+                pool_size=app.config.get('DB_POOL_SIZE'),
+                max_connections=app.config.get('DB_MAX_CONNECTIONS'),
+                timeout=app.config.get('DB_POOL_TIMEOUT', DB_POOL_TIMEOUT),
+                recycle=app.config.get('DB_POOL_RECYCLE', DB_POOL_RECYCLE),
+                pre_ping=app.config.get('DB_POOL_PRE_PING', True))
+            options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+            app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+        for target, identifier, listener in (
+            (Engine, 'engine_connect', self.on_engine_connect),
+            (Pool, 'connect', self.on_connect),
+            (Pool, 'checkout', self.on_checkout),
+            (Pool, 'invalidate', self.on_invalidate),
+        ):
+            if not event.contains(target, identifier, listener):
+                event.listen(target, identifier, listener)
+
+        app.extensions = getattr(app, "extensions", {})
+        app.extensions[EXTENSION_NAME] = self
+
+    def on_engine_connect(self, connection, branch):  # pylint: disable=unused-argument
+        self.engines.add(connection.engine)
+
+    def on_connect(self, dbapi_connection, connection_record):  # pylint: disable=unused-argument
+        connection_record.info[PID_KEY] = os.getpid()
+        self.counters.increment('connects')
+
+    def on_checkout(self, dbapi_connection, connection_record, connection_proxy):  # pylint: disable=unused-argument
+        pid = connection_record.info.get(PID_KEY)
+        if pid is not None and pid != os.getpid():
+            # Inherited from the parent process: drop it without closing the shared socket
+            connection_record.dbapi_connection = connection_proxy.dbapi_connection = None
+            raise exc.DisconnectionError(
+                f'Connection opened by process {pid} checked out by {os.getpid()}')
+        self.counters.increment('checkouts')
+
+    def on_invalidate(self, dbapi_connection, connection_record, exception):  # pylint: disable=unused-argument
+        self.counters.increment('invalidated')
+
+    def dispose(self):
+        """Close the pooled connections of every engine, call it before forking."""
+        for engine in list(self.engines):
+            engine.dispose()
+
+    def after_fork(self):
+        """Reset the metrics inherited from the parent, call it in the forked worker."""
+        self.pid = os.getpid()
+        self.counters.reset()
+
+    def stats(self) -> dict:
+        """Counters of the process along with the live state of each engine pool.
+        :returns: {'pid', 'connects', 'checkouts', 'timeouts', 'invalidated', 'wait_time',
+            'max_wait_time', 'avg_wait_time', 'pools': [{'url', 'size', 'checked_out',
+            'overflow', 'checked_in'}]}
+        """
+        pools = []
+        for engine in list(self.engines):
+            pool = engine.pool
+            if isinstance(pool, QueuePool):
+                pools.append({
+                    'url': repr(engine.url),
+                    'size': pool.size(),
+                    'checked_out': pool.checkedout(),
+                    'overflow': max(pool.overflow(), 0),
+                    'checked_in': pool.checkedin(),
+                })
+
+        return dict(self.counters.as_dict(), pid=os.getpid(), pools=pools)
+
+
+def pool_options(workers: int,
+                 threads: int,
+                 pool_size: int = None,
+                 max_connections: int = None,
+                 timeout: int = DB_POOL_TIMEOUT,
+                 recycle: int = DB_POOL_RECYCLE,
+                 pre_ping: bool = True) -> dict:
+    """Engine options of one worker process.
+
+    :param workers: Worker processes sharing the database.
+    :param threads: Threads of each worker, one connection each.
+    :param pool_size: Persistent connections of the worker, defaults to threads.
+    :param max_connections: Connection budget of all the workers, 0 or None for no limit.
+        The overflow of each worker is what is left of its share of the budget, without a
+        budget it is the pool size.
+    :returns: A dict for SQLALCHEMY_ENGINE_OPTIONS.
+    """
+    pool_size = pool_size or max(threads, 1)
+    max_overflow = pool_size
+
+    if max_connections:
+        share = max(max_connections // max(workers, 1), 1)
+        pool_size = min(pool_size, share)
+        max_overflow = share - pool_size
+
+    return {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': timeout,
+        'pool_recycle': recycle,
+        'pool_pre_ping': pre_ping,
+    }
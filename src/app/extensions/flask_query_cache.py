@@ -0,0 +1,264 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, loading
+from sqlalchemy.sql.util import find_tables
+
+from src.app.extensions.lru_cache import LRUCache
+
+EXTENSION_NAME = 'flask-query-cache'
+
+QUERY_CACHE_SIZE = 1024
+
+QUERY_CACHE_TTL = 60
+
+# Execution option enabling the cache on a query, its value is the ttl or True for the default one
+CACHE_OPTION = 'result_cache'
+
+# Session.info key collecting the tables written by the current transaction
+CHANGED_TABLES = 'result_cache_changed_tables'
+
+
+class MemoryBackend(object):
+    """Per process LRU store."""
+
+    def __init__(self, maxsize: int = QUERY_CACHE_SIZE):
+        self.cache = LRUCache(maxsize=maxsize)
+        self.generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value, ttl: float):
+        self.cache.set(key, value, ttl=ttl)
+
+    def table_generations(self, tables) -> tuple:
+        return tuple(self.generations.get(table, 0) for table in tables)
+
+    def bump(self, tables):
+        with self._lock:
+            for table in tables:
+                self.generations[table] = self.generations.get(table, 0) + 1
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self) -> dict:
+        return self.cache.stats()
+
+
+class SQLiteBackend(object):
+    """Store shared by every worker process of a host through a local SQLite file.
+
+    Results are pickled, the least recently used entries are evicted past maxsize and
+    table generations are shared so a commit in one worker invalidates every worker.
+    Put the file on a local filesystem, ideally a tmpfs such as /dev/shm.
+    """
+
+    def __init__(self, path: str, maxsize: int = QUERY_CACHE_SIZE):
+        self.path = path
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+
+        with self.connection() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value BLOB, '
+                'expires REAL, accessed REAL)')
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS ix_results_accessed ON results (accessed)')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS generations (name TEXT PRIMARY KEY, generation INTEGER)'
+            )
+
+    def connection(self) -> sqlite3.Connection:
+        # Connections are not shared between threads nor inherited across a fork
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key):
+        now = time.time()
+        connection = self.connection()
+        row = connection.execute(
+            'SELECT value FROM results WHERE key = ? AND expires > ?',
+            (key, now)).fetchone()
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        connection.execute('UPDATE results SET accessed = ? WHERE key = ?',
+                           (now, key))
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl: float):
+        now = time.time()
+        connection = self.connection()
+        connection.execute(
+            'INSERT OR REPLACE INTO results (key, value, expires, accessed) VALUES (?, ?, ?, ?)',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), now + ttl, now))
+        connection.execute(
+            'DELETE FROM results WHERE expires <= ? OR key IN (SELECT key FROM results '
+            'ORDER BY accessed DESC LIMIT -1 OFFSET ?)', (now, self.maxsize))
+
+    def table_generations(self, tables) -> tuple:
+        rows = dict(self.connection().execute(
+            f'SELECT name, generation FROM generations WHERE name IN ({",".join("?" * len(tables))})',
+            tuple(tables)).fetchall()) if tables else {}
+        return tuple(rows.get(table, 0) for table in tables)
+
+    def bump(self, tables):
+        connection = self.connection()
+        for table in tables:
+            connection.execute(
+                'INSERT INTO generations (name, generation) VALUES (?, 1) '
+                'ON CONFLICT (name) DO UPDATE SET generation = generation + 1',
+                (table, ))
+
+    def clear(self):
+        self.connection().execute('DELETE FROM results')
+
+    def stats(self) -> dict:
+        size = self.connection().execute('SELECT count(*) FROM results').fetchone()[0]
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': size,
+            'maxsize': self.maxsize,
+        }
+
+
+class QueryCache(object):
+    """Opt-in second level cache of ORM query results.
+
+    Enable it per query through the result_cache execution option (or BaseRepository.cached):
+
+        User.query.filter_by(active=True).execution_options(result_cache=300).all()
+
+    Results are keyed on the compiled statement, its parameters and the generation of every
+    table it reads. Committing a transaction that flushed, inserted, updated or deleted rows
+    of a table bumps that table generation, so its cached results are never served again.
+    Writes done outside the session events (e.g. bulk_update_mappings) are registered with
+    mark_changed.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = QUERY_CACHE_TTL
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: 'Flask'):
+        self.app = app
+        self.ttl = app.config.get('QUERY_CACHE_TTL', QUERY_CACHE_TTL)
+        maxsize = app.config.get('QUERY_CACHE_SIZE', QUERY_CACHE_SIZE)
+
+        if app.config.get('QUERY_CACHE_BACKEND', 'memory') == 'sqlite':
+            self.backend = SQLiteBackend(app.config['QUERY_CACHE_PATH'],
+                                         maxsize=maxsize)
+        else:
+            self.backend = MemoryBackend(maxsize=maxsize)
+
+        for identifier, listener in (
+            ('do_orm_execute', self.on_execute),
+            ('after_flush', self.on_flush),
+            ('after_commit', self.on_commit),
+            ('after_rollback', self.on_rollback),
+        ):
+            if not event.contains(Session, identifier, listener):
+                event.listen(Session, identifier, listener)
+
+        app.extensions = getattr(app, "extensions", {})
+        app.extensions[EXTENSION_NAME] = self
+
+    def stats(self) -> dict:
+        return self.backend.stats()
+
+    def on_execute(self, orm_context):
+        if orm_context.is_insert or orm_context.is_update or orm_context.is_delete:
+            mark_changed(orm_context.session, orm_context.statement.table)
+            return None
+
+        ttl = orm_context.execution_options.get(CACHE_OPTION)
+        if not ttl or not orm_context.is_select or self.backend is None:
+            return None
+
+        statement = orm_context.statement
+        tables = sorted({table.name for table in find_tables(statement, include_joins=True)})
+
+        # Rows flushed but not committed by this transaction are neither served from nor
+        # stored in the cache, other sessions must not see them and a rollback bumps nothing
+        if orm_context.session.info.get(CHANGED_TABLES, set()).intersection(tables):
+            return None
+
+        compiled = statement.compile(compile_kwargs={'render_postcompile': True})
+        params = dict(compiled.params, **(orm_context.parameters or {}))
+        key = hashlib.blake2b(
+            repr((str(compiled), sorted(params.items()), tables,
+                  self.backend.table_generations(tables))).encode('utf-8'),
+            digest_size=20).hexdigest()
+
+        frozen_result = self.backend.get(key)
+        if frozen_result is None:
+            frozen_result = self.invoke(orm_context).freeze()
+            self.backend.set(key, frozen_result,
+                             ttl=self.ttl if ttl is True else ttl)
+
+        return loading.merge_frozen_result(orm_context.session, statement,
+                                           frozen_result, load=False)()
+
+    @staticmethod
+    def invoke(orm_context):
+        # ORMExecuteState.invoke_statement passes bind arguments the Flask-SQLAlchemy
+        # session get_bind does not accept, the statement is executed again uncached instead
+        return orm_context.session.execute(
+            orm_context.statement,
+            orm_context.parameters,
+            execution_options=dict(orm_context.local_execution_options,
+                                   **{CACHE_OPTION: False}),
+            bind_arguments={
+                key: value
+                for key, value in orm_context.bind_arguments.items()
+                if key in ('mapper', 'clause')
+            })
+
+    @staticmethod
+    def on_flush(session, flush_context):  # pylint: disable=unused-argument
+        for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+            mapper = inspect(instance).mapper
+            mark_changed(session, *mapper.tables)
+            mark_changed(session, *[
+                relationship.secondary for relationship in mapper.relationships
+                if relationship.secondary is not None
+            ])
+
+    def on_commit(self, session):
+        tables = session.info.pop(CHANGED_TABLES, None)
+        if tables and self.backend is not None:
+            self.backend.bump(sorted(tables))
+
+    @staticmethod
+    def on_rollback(session):
+        session.info.pop(CHANGED_TABLES, None)
+
+
+def mark_changed(session, *tables):
+    """Register tables written in the session transaction, their cached results
+    are invalidated when it commits."""
+    session.info.setdefault(CHANGED_TABLES, set()).update(
+        table.name for table in tables)
@@ -0,0 +1,188 @@
+import functools
+import re
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+EXTENSION_NAME = 'flask-query-tracker'
+
+# Connection info key of the start times of the statements being executed
+START_KEY = 'query_tracker_start'
+
+# Statements of the same shape run more often than this in a request are reported as N+1
+SQL_N_PLUS_ONE = 5
+
+SQL_SLOWEST = 3
+
+SQL_THRESHOLDS = {
+    'queries': 50,
+    'time': 0.5,
+}
+
+# Bound parameter lists, literals and blanks collapsed to get the shape of a statement
+SHAPE_PATTERNS = (
+    (re.compile(r'\s+'), ' '),
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%\(\w+\)s|%s|(?<!:):\w+|\$\d+'), '?'),
+    (re.compile(r'\?(?:\s*,\s*\?)+'), '?'),
+)
+
+SHAPE_MAX_LENGTH = 200
+
+
+class RequestQueries(object):
+    """Statements executed while handling one request."""
+
+    __slots__ = ('count', 'time', 'shapes', 'slowest', 'started')
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.shapes = {}
+        self.slowest = []
+        self.started = time.perf_counter()
+
+    def add(self, statement: str, duration: float, slowest: int = SQL_SLOWEST):
+        shape = statement_shape(statement)
+        self.count += 1
+        self.time += duration
+        self.shapes[shape] = self.shapes.get(shape, 0) + 1
+
+        if len(self.slowest) < slowest or duration > self.slowest[-1][0]:
+            self.slowest.append((duration, shape))
+            self.slowest.sort(reverse=True)
+            del self.slowest[slowest:]
+
+    def repeated(self, threshold: int = SQL_N_PLUS_ONE) -> dict:
+        """Shapes of the SELECT statements run more than threshold times, N+1 candidates."""
+        return {
+            shape: count
+            for shape, count in self.shapes.items()
+            if count > threshold and shape.lstrip('( ').upper().startswith('SELECT')
+        }
+
+    def summary(self, threshold: int = SQL_N_PLUS_ONE) -> dict:
+        return {
+            'queries': self.count,
+            'time_ms': round(self.time * 1000, 2),
+            'slowest': [(round(duration * 1000, 2), shape)
+                        for duration, shape in self.slowest],
+            'repeated': self.repeated(threshold),
+        }
+
+
+class QueryTracker(object):
+    """Per request SQL instrumentation.
+
+    Every statement executed during a request is counted and timed through the engine cursor
+    events. The totals go out in a Server-Timing header (SQL_SERVER_TIMING), in the RequestLogger
+    records, and a warning is logged when a request runs more queries or spends more
+    time in the database than its thresholds:
+
+        SQL_THRESHOLDS = {'queries': 50, 'time': 0.5}
+        SQL_ENDPOINT_THRESHOLDS = {'users.list': {'queries': 5}}
+
+    Statement shapes (literals and parameter lists stripped) repeated more than SQL_N_PLUS_ONE
+    times are reported as N+1 candidates.
+    """
+
+    def __init__(self, app=None):
+        self.n_plus_one = SQL_N_PLUS_ONE
+        self.slowest = SQL_SLOWEST
+        self.thresholds = SQL_THRESHOLDS
+        self.endpoint_thresholds = {}
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: 'Flask'):
+        self.app = app
+        self.n_plus_one = app.config.get('SQL_N_PLUS_ONE', SQL_N_PLUS_ONE)
+        self.slowest = app.config.get('SQL_SLOWEST', SQL_SLOWEST)
+        self.thresholds = dict(SQL_THRESHOLDS,
+                               **app.config.get('SQL_THRESHOLDS', {}))
+        self.endpoint_thresholds = app.config.get('SQL_ENDPOINT_THRESHOLDS', {})
+
+        if not app.config.get('SQL_INSTRUMENTATION', True):
+            return
+
+        for identifier, listener in (
+            ('before_cursor_execute', self.before_cursor_execute),
+            ('after_cursor_execute', self.after_cursor_execute),
+            ('handle_error', self.handle_error),
+        ):
+            if not event.contains(Engine, identifier, listener):
+                event.listen(Engine, identifier, listener)
+
+        app.before_request(self.start)
+        app.after_request(self.finish)
+
+        app.extensions = getattr(app, "extensions", {})
+        app.extensions[EXTENSION_NAME] = self
+
+    @staticmethod
+    def start():
+        g.sql_queries = RequestQueries()
+
+    @staticmethod
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):  # pylint: disable=unused-argument,too-many-arguments
+        conn.info.setdefault(START_KEY, []).append(time.perf_counter())
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):  # pylint: disable=unused-argument,too-many-arguments
+        starts = conn.info.get(START_KEY)
+        if not starts:
+            return
+        duration = time.perf_counter() - starts.pop()
+
+        queries = g.get('sql_queries') if has_request_context() else None
+        if queries is not None:
+            queries.add(statement, duration, slowest=self.slowest)
+
+    @staticmethod
+    def handle_error(context):
+        # A failed statement never reaches after_cursor_execute, its start would stay on the
+        # pooled connection and be taken for the start of the next statement
+        if context.connection is not None and context.execution_context is not None:
+            starts = context.connection.info.get(START_KEY)
+            if starts:
+                starts.pop()
+
+    def thresholds_for(self, endpoint: str) -> dict:
+        return dict(self.thresholds, **self.endpoint_thresholds.get(endpoint, {}))
+
+    def finish(self, response):
+        """after_request hook adding Server-Timing and warning about the thresholds."""
+        queries = g.get('sql_queries')
+        if queries is None:
+            return response
+
+        if self.app.config.get('SQL_SERVER_TIMING', True):
+            elapsed = time.perf_counter() - queries.started
+            response.headers.add(
+                'Server-Timing',
+                f'db;dur={queries.time * 1000:.2f};desc="{queries.count} queries", '
+                f'app;dur={elapsed * 1000:.2f}')
+
+        thresholds = self.thresholds_for(request.endpoint)
+        repeated = queries.repeated(self.n_plus_one)
+        if queries.count > thresholds['queries'] or queries.time > thresholds['time'] \
+                or repeated:
+            self.app.logger.warning(
+                f'[{request.method}] {request.path} ran {queries.count} queries in '
+                f'{queries.time * 1000:.1f}ms (limits {thresholds["queries"]} queries, '
+                f'{thresholds["time"] * 1000:.0f}ms), '
+                f'slowest={queries.summary(self.n_plus_one)["slowest"]}, repeated={repeated}'
+            )
+
+        return response
+
+
+@functools.lru_cache(maxsize=1024)
+def statement_shape(statement: str) -> str:
+    """Statement with its literals and parameter lists replaced by ?, used to group statements."""
+    for pattern, replacement in SHAPE_PATTERNS:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()[:SHAPE_MAX_LENGTH]
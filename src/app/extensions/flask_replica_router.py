@@ -0,0 +1,212 @@
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import has_request_context, request
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import create_engine, event, orm
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.sql.dml import UpdateBase
+
+EXTENSION_NAME = 'flask-replica-router'
+
+REPLICA_SELECTION = 'round_robin'
+
+# Seconds a failing replica is left out before being tried again
+REPLICA_RETRY_AFTER = 30
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Session.info keys: the session sticks to the primary, reads forced to a replica, chosen replica
+PRIMARY_KEY = 'replica_router_primary'
+FORCED_KEY = 'replica_router_forced'
+REPLICA_KEY = 'replica_router_replica'
+
+
+class Replica(object):
+    """Engine of a read replica, created on first use, and its health."""
+
+    def __init__(self, uri: str, options: dict, retry_after: float = REPLICA_RETRY_AFTER):
+        self.uri = uri
+        self.options = options
+        self.retry_after = retry_after
+        self.engine = None
+        self.down_until = 0.0
+        self._lock = threading.Lock()
+
+    def get_engine(self):
+        if self.engine is None:
+            with self._lock:
+                if self.engine is None:
+                    self.engine = create_engine(self.uri, **self.options)
+                    event.listen(self.engine, 'handle_error', self.on_error)
+        return self.engine
+
+    @property
+    def available(self) -> bool:
+        return self.down_until <= time.monotonic()
+
+    def mark_down(self):
+        self.down_until = time.monotonic() + self.retry_after
+
+    def checked_out(self) -> int:
+        if self.engine is None:
+            return 0
+        return getattr(self.engine.pool, 'checkedout', lambda: 0)()
+
+    def on_error(self, context):
+        if context.is_disconnect:
+            self.mark_down()
+
+
+class ReplicaRouter(object):
+    """Send the reads of safe requests to read replicas.
+
+    Replicas are listed in SQLALCHEMY_REPLICA_URIS and picked per session by round robin or by
+    least checked out connections (REPLICA_SELECTION). The session of a GET, HEAD or OPTIONS
+    request reads from a replica, other requests read from one only inside replica():
+
+        with ReplicaRouter.replica():
+            report = ReportRepository().summary()
+
+    A session sticks to the primary once it flushes or executes an insert, update or delete,
+    so the rest of the request reads its own writes. SELECT ... FOR UPDATE and models bound
+    with __bind_key__ always use their own engine.
+
+    Connections are checked at checkout by the pool_pre_ping of SQLALCHEMY_ENGINE_OPTIONS. A
+    read failing on a replica with an OperationalError is retried on the primary, where the
+    session stays, and the replica is left out for REPLICA_RETRY_AFTER seconds.
+    """
+
+    def __init__(self, app=None):
+        self.replicas = []
+        self.selection = REPLICA_SELECTION
+        self.retry_after = REPLICA_RETRY_AFTER
+        self._counter = itertools.count()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: 'Flask'):
+        self.app = app
+        self.selection = app.config.get('REPLICA_SELECTION', REPLICA_SELECTION)
+        self.retry_after = app.config.get('REPLICA_RETRY_AFTER',
+                                          REPLICA_RETRY_AFTER)
+        if self.selection not in ('round_robin', 'least_connections'):
+            raise Exception(
+                f"ReplicaRouterError - Unknown REPLICA_SELECTION {self.selection}, "
+                "expecting 'round_robin' or 'least_connections'")
+
+        options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+        self.replicas = [
+            Replica(uri, options, retry_after=self.retry_after)
+            for uri in app.config.get('SQLALCHEMY_REPLICA_URIS') or []
+        ]
+
+        app.extensions = getattr(app, "extensions", {})
+        app.extensions[EXTENSION_NAME] = self
+
+    def choose(self):
+        """Return the engine of an available replica, None when every replica is down."""
+        replicas = [replica for replica in self.replicas if replica.available]
+        if not replicas:
+            return None
+
+        if self.selection == 'least_connections':
+            return min(replicas, key=Replica.checked_out).get_engine()
+
+        return replicas[next(self._counter) % len(replicas)].get_engine()
+
+    def mark_down(self, engine):
+        for replica in self.replicas:
+            if replica.engine is engine:
+                replica.mark_down()
+
+    @contextmanager
+    def replica(self, session=None):
+        """Read from a replica inside the block whatever the request method.
+        :param session: Defaults to the Flask-SQLAlchemy session.
+        """
+        session = session or self.app.extensions['sqlalchemy'].db.session
+        forced = session.info.get(FORCED_KEY, False)
+        session.info[FORCED_KEY] = True
+        try:
+            yield session
+        finally:
+            session.info[FORCED_KEY] = forced
+
+    def stats(self) -> list:
+        return [{
+            'url': repr(make_url(replica.uri)),
+            'available': replica.available,
+            'checked_out': replica.checked_out(),
+        } for replica in self.replicas]
+
+
+class RoutingSession(SignallingSession):
+    """Flask-SQLAlchemy session asking the ReplicaRouter of its app for the bind of reads."""
+
+    def __init__(self, *args, **kwargs):
+        # Whether the last statement was bound to a replica
+        self.replica_bind = False
+        super().__init__(*args, **kwargs)
+
+    def execute(self, statement, *args, **kwargs):  # pylint: disable=arguments-differ
+        try:
+            return super().execute(statement, *args, **kwargs)
+        except OperationalError:
+            if not self.replica_bind or self.new or self.dirty or self.deleted:
+                raise
+
+        self.app.extensions[EXTENSION_NAME].mark_down(self.info.get(REPLICA_KEY))
+        # The transaction holds the broken replica connection, the session only read so far
+        self.rollback()
+        self.info[PRIMARY_KEY] = True
+        return super().execute(statement, *args, **kwargs)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):  # pylint: disable=arguments-differ,unused-argument
+        self.replica_bind = False
+        if self.use_primary(mapper, clause):
+            return super().get_bind(mapper, clause)
+
+        engine = self.info.get(REPLICA_KEY)
+        if engine is None:
+            engine = self.app.extensions[EXTENSION_NAME].choose()
+            if engine is None:
+                return super().get_bind(mapper, clause)
+            self.info[REPLICA_KEY] = engine
+
+        self.replica_bind = True
+        return engine
+
+    def use_primary(self, mapper, clause) -> bool:
+        if self.info.get(PRIMARY_KEY):
+            return True
+
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.info[PRIMARY_KEY] = True
+            return True
+
+        router = self.app.extensions.get(EXTENSION_NAME)
+        if router is None or not router.replicas:
+            return True
+
+        if getattr(clause, '_for_update_arg', None) is not None:
+            return True
+
+        if mapper is not None and mapper.persist_selectable.info.get('bind_key') is not None:
+            return True
+
+        if self.info.get(FORCED_KEY):
+            return False
+
+        return not (has_request_context() and request.method in SAFE_METHODS)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """SQLAlchemy extension whose sessions route reads with the ReplicaRouter."""
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
@@ -0,0 +1,251 @@
+import atexit
+import logging
+import queue
+import random
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, request
+
+from src.app.extensions.flask_exception_handler import get_ip_address
+from src.app.extensions.flask_json_encoder import DEFAULT_ENCODER
+from src.app.extensions.flask_json_encoder import \
+    EXTENSION_NAME as JSON_ENCODER_EXTENSION
+
+EXTENSION_NAME = 'flask-request-logger'
+
+LOGGER_NAME = 'src.requests'
+
+# Share of the requests logged by status class, a rate of an endpoint in
+# LOG_ROUTE_SAMPLE_RATES takes precedence
+LOG_SAMPLE_RATES = {
+    '1xx': 0.0,
+    '2xx': 0.1,
+    '3xx': 0.1,
+    '4xx': 1.0,
+    '5xx': 1.0,
+}
+
+LOG_PAYLOAD_MAX_SIZE = 1024
+
+# Payload and query string keys containing one of these, case insensitive, are logged masked
+LOG_REDACTED_KEYS = ('password', 'token', 'secret', 'authorization', 'api_key', '_profile')
+
+REDACTED = '[REDACTED]'
+
+LOG_QUEUE_SIZE = 10000
+
+# Requests slower than this many seconds are always logged
+LOG_SLOW_REQUEST = 1.0
+
+SKIPPED_PATHS = ('/favicon.ico', '/static')
+
+
+def redact(value, keys: tuple = LOG_REDACTED_KEYS):
+    """Copy of a json value with the values of the keys containing one of keys masked."""
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if any(part in str(key).lower() for part in keys) else redact(item, keys)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [redact(item, keys) for item in value]
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, dictionaries logged as the message are merged into it."""
+
+    def __init__(self, encoder=None):
+        super().__init__()
+        self.encoder = encoder or DEFAULT_ENCODER
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+        }
+        if isinstance(record.msg, dict):
+            entry.update(record.msg)
+        else:
+            entry['message'] = record.getMessage()
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+
+        return self.encoder.dumps(entry).decode('utf-8')
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records when the queue is full instead of blocking or failing.
+
+    Records are queued as they are, formatting happens in the listener thread.
+    """
+
+    def __init__(self, queue_):
+        super().__init__(queue_)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RequestLogger(object):
+    """Structured, sampled request logs written off the request thread.
+
+    Requests are logged as JSON records, sampled by status class (LOG_SAMPLE_RATES) or by
+    endpoint (LOG_ROUTE_SAMPLE_RATES); slow requests are always logged. Records go through a
+    bounded queue to a listener thread, so a slow stdout never blocks a request and records
+    are dropped, and counted, when the queue is full.
+
+    With LOG_PAYLOADS, JSON payloads are included up to LOG_PAYLOAD_MAX_SIZE characters. The
+    values of payload and query string keys matching LOG_REDACTED_KEYS are masked.
+    """
+
+    def __init__(self, app=None):
+        self.logger = logging.getLogger(LOGGER_NAME)
+        self.handler = None
+        self.listener = None
+        self.sample_rates = LOG_SAMPLE_RATES
+        self.route_sample_rates = {}
+        self.log_payloads = False
+        self.payload_max_size = LOG_PAYLOAD_MAX_SIZE
+        self.redacted_keys = LOG_REDACTED_KEYS
+        self.slow_request = LOG_SLOW_REQUEST
+        self._atexit_registered = False
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: 'Flask'):
+        self.app = app
+        self.sample_rates = dict(LOG_SAMPLE_RATES,
+                                 **app.config.get('LOG_SAMPLE_RATES', {}))
+        self.route_sample_rates = app.config.get('LOG_ROUTE_SAMPLE_RATES', {})
+        self.log_payloads = app.config.get('LOG_PAYLOADS', False)
+        self.payload_max_size = app.config.get('LOG_PAYLOAD_MAX_SIZE',
+                                               LOG_PAYLOAD_MAX_SIZE)
+        self.redacted_keys = tuple(
+            key.lower() for key in app.config.get('LOG_REDACTED_KEYS', LOG_REDACTED_KEYS))
+        self.slow_request = app.config.get('LOG_SLOW_REQUEST', LOG_SLOW_REQUEST)
+
+        if not app.config.get('LOG_REQUESTS', True):
+            return
+
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(
+            JsonFormatter(app.extensions.get(JSON_ENCODER_EXTENSION)))
+
+        self.stop()
+        self.handler = DroppingQueueHandler(
+            queue.Queue(app.config.get('LOG_QUEUE_SIZE', LOG_QUEUE_SIZE)))
+        self.listener = QueueListener(self.handler.queue, stream_handler)
+        self.listener.start()
+        if not self._atexit_registered:
+            atexit.register(self.stop)
+            self._atexit_registered = True
+
+        self.logger.handlers = [self.handler]
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+
+        app.before_request(self.start_timer)
+        app.after_request(self.log_request)
+
+        app.extensions = getattr(app, "extensions", {})
+        app.extensions[EXTENSION_NAME] = self
+
+    def stop(self):
+        """Flush the queued records and stop the listener thread."""
+        if self.listener is not None and self.listener._thread is not None:  # pylint: disable=protected-access
+            self.listener.stop()
+
+    def after_fork(self):
+        """Start a listener thread in the forked worker, threads do not survive a fork and
+        the inherited queue lock may be held."""
+        if self.listener is not None:
+            self.handler.queue = queue.Queue(self.handler.queue.maxsize)
+            self.listener = QueueListener(self.handler.queue, *self.listener.handlers)
+            self.listener.start()
+
+    @staticmethod
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    def sampled(self, status: int, elapsed: float) -> bool:
+        if elapsed >= self.slow_request:
+            return True
+
+        rate = self.route_sample_rates.get(request.endpoint)
+        if rate is None:
+            rate = self.sample_rates.get(f'{status // 100}xx', 1.0)
+
+        return rate >= 1.0 or random.random() < rate
+
+    def log_request(self, response):
+        """after_request hook queuing the record of the sampled requests."""
+        if request.path.startswith(SKIPPED_PATHS):
+            return response
+
+        elapsed = time.perf_counter() - g.get('request_started', time.perf_counter())
+        if not self.sampled(response.status_code, elapsed):
+            return response
+
+        entry = {
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 2),
+            'ip': get_ip_address(),
+            'request_id': request.headers.get('X-Request-ID'),
+        }
+
+        if request.args:
+            entry['params'] = redact(request.args.to_dict(flat=False), self.redacted_keys)
+
+        payload = self.payload()
+        if payload is not None:
+            entry['payload'] = payload
+
+        queries = g.get('sql_queries')
+        if queries is not None and queries.count:
+            entry['sql'] = queries.summary()
+
+        self.logger.info(entry)
+
+        return response
+
+    def payload(self):
+        """The redacted JSON body with LOG_PAYLOADS, truncated to payload_max_size characters.
+
+        get_json returns the body the view already parsed, bodies larger than the limit are
+        not parsed for the log.
+        """
+        if not self.log_payloads or not request.is_json:
+            return None
+        if request.content_length is None or request.content_length > self.payload_max_size:
+            return None
+
+        payload = request.get_json(silent=True)
+        if payload is None:
+            return None
+
+        payload = redact(payload, self.redacted_keys)
+        text = DEFAULT_ENCODER.dumps(payload).decode('utf-8')
+        if len(text) > self.payload_max_size:
+            return text[:self.payload_max_size] + '...'
+        return payload
+
+    def stats(self) -> dict:
+        return {
+            'queued': self.handler.queue.qsize() if self.handler else 0,
+            'dropped': self.handler.dropped if self.handler else 0,
+        }
@@ -0,0 +1,192 @@
+import cProfile
+import glob
+import io
+import os
+import pstats
+import random
+import tempfile
+import threading
+import time
+import uuid
+
+from flask import current_app, g, request
+from itsdangerous import BadSignature
+
+from src.app.extensions.flask_json_encoder import json_encoder
+from src.app.extensions.flask_serializer_manager import \
+    EXTENSION_NAME as SERIALIZER_EXTENSION_NAME
+
+EXTENSION_NAME = 'flask-request-profiler'
+
+PROFILER_HEADER = 'X-Profile'
+
+PROFILER_QUERY_ARG = '_profile'
+
+PROFILER_DIR = os.path.join(tempfile.gettempdir(), 'flask-profiles')
+
+PROFILER_MAX_FILES = 100
+
+PROFILER_TOP = 25
+
+# Signed token payload prefix, followed by the expiration timestamp
+TOKEN_PREFIX = 'profile:'
+
+# (file name part, function name) of the functions whose cumulative time is serialization
+SERIALIZATION_FUNCTIONS = (
+    ('marshmallow/schema.py', 'dump'),
+    ('flask_json_encoder.py', 'dumps'),
+    ('<compiled ', 'dump_many'),
+)
+
+
+class RequestProfiler(object):
+    """Opt-in cProfile runs of single requests.
+
+    With PROFILER_ENABLED a request carrying a valid token in the X-Profile header or the
+    _profile query argument is profiled and answered with a summary of the run instead of its
+    body: top functions by cumulative time, database time (from QueryTracker) and serialization
+    time. Tokens are signed with SerializerManager.sign and expire, generate one with
+    `flask profile-token`.
+
+    PROFILER_SAMPLE_RATE profiles that share of the other requests without changing their
+    response. Profiles of both kinds are stored as pstats files along with their JSON summary
+    in PROFILER_DIR, the last PROFILER_MAX_FILES are kept.
+
+    cProfile only follows the thread of the request, a process profiles one request at a time
+    and the body of streamed responses is not part of the profile.
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.sample_rate = 0.0
+        self.directory = PROFILER_DIR
+        self.max_files = PROFILER_MAX_FILES
+        self.top = PROFILER_TOP
+        self._lock = threading.Lock()
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: 'Flask'):
+        self.app = app
+        self.enabled = app.config.get('PROFILER_ENABLED', False)
+        self.sample_rate = app.config.get('PROFILER_SAMPLE_RATE', 0.0)
+        self.directory = app.config.get('PROFILER_DIR') or PROFILER_DIR
+        self.max_files = app.config.get('PROFILER_MAX_FILES', PROFILER_MAX_FILES)
+        self.top = app.config.get('PROFILER_TOP', PROFILER_TOP)
+
+        if not self.enabled:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        app.before_request(self.start)
+        app.after_request(self.finish)
+        app.teardown_request(self.stop)
+
+        app.extensions = getattr(app, "extensions", {})
+        app.extensions[EXTENSION_NAME] = self
+
+    @staticmethod
+    def token(expiration: int = 3600) -> str:
+        """Signed token enabling the profiling of requests for expiration seconds."""
+        serializer = current_app.extensions[SERIALIZER_EXTENSION_NAME]
+        return serializer.sign(f'{TOKEN_PREFIX}{int(time.time()) + expiration}').decode('utf-8')
+
+    @staticmethod
+    def triggered() -> bool:
+        token = request.headers.get(PROFILER_HEADER) or request.args.get(PROFILER_QUERY_ARG)
+        serializer = current_app.extensions.get(SERIALIZER_EXTENSION_NAME)
+        if not token or serializer is None:
+            return False
+
+        try:
+            payload = serializer.unsign(token).decode('utf-8')
+        except BadSignature:
+            return False
+
+        return payload.startswith(TOKEN_PREFIX) \
+            and payload[len(TOKEN_PREFIX):].isdigit() \
+            and int(payload[len(TOKEN_PREFIX):]) > time.time()
+
+    def start(self):
+        triggered = self.triggered()
+        if not triggered and (not self.sample_rate or random.random() >= self.sample_rate):
+            return
+
+        # One profiled request at a time, the others run as usual
+        if not self._lock.acquire(blocking=False):  # pylint: disable=consider-using-with
+            return
+
+        g.profiler = cProfile.Profile()
+        g.profiler_triggered = triggered
+        g.profiler_started = time.perf_counter()
+        g.profiler.enable()
+
+    def stop(self, error=None):  # pylint: disable=unused-argument
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            self._lock.release()
+        return profiler
+
+    def finish(self, response):
+        """after_request hook storing the profile and answering triggered requests with it."""
+        profiler = self.stop()
+        if profiler is None:
+            return response
+
+        elapsed = time.perf_counter() - g.profiler_started
+        stats = pstats.Stats(profiler, stream=io.StringIO())
+        summary = self.summarize(stats, elapsed, response.status_code)
+        self.store(stats, summary)
+
+        if not g.get('profiler_triggered'):
+            return response
+
+        return json_encoder().response({'data': summary, 'errors': None})
+
+    def summarize(self, stats: pstats.Stats, elapsed: float, status: int) -> dict:
+        functions = []
+        serialization = 0.0
+        for (filename, line, name), (_, calls, total, cumulative, _) in stats.stats.items():
+            functions.append((cumulative, total, calls, f'{filename}:{line}({name})'))
+            if any(part in filename and name == function
+                   for part, function in SERIALIZATION_FUNCTIONS):
+                serialization += cumulative
+        functions.sort(reverse=True)
+
+        queries = g.get('sql_queries')
+        return {
+            'id': uuid.uuid4().hex,
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint,
+            'status': status,
+            'time_ms': round(elapsed * 1000, 2),
+            'db_time_ms': round(queries.time * 1000, 2) if queries is not None else None,
+            'db_queries': queries.count if queries is not None else None,
+            'serialization_time_ms': round(serialization * 1000, 2),
+            'functions': [{
+                'function': function,
+                'calls': calls,
+                'total_ms': round(total * 1000, 3),
+                'cumulative_ms': round(cumulative * 1000, 3),
+            } for cumulative, total, calls, function in functions[:self.top]],
+        }
+
+    def store(self, stats: pstats.Stats, summary: dict):
+        """Write the pstats file (for snakeviz, flameprof...) and the summary, drop old ones."""
+        name = f'{time.strftime("%Y%m%dT%H%M%S")}-{summary["endpoint"]}-{summary["id"]}'
+        path = os.path.join(self.directory, name)
+        stats.dump_stats(f'{path}.prof')
+        with open(f'{path}.json', 'wb') as file:
+            file.write(json_encoder().dumps(summary))
+
+        files = sorted(glob.glob(os.path.join(self.directory, '*.prof')),
+                       key=os.path.getmtime)
+        for old in files[:-self.max_files]:
+            for extension in ('.prof', '.json'):
+                try:
+                    os.remove(old[:-len('.prof')] + extension)
+                except OSError:
+                    pass
@@ -1,46 +1,244 @@
-from flask import make_response, jsonify, request
+import hashlib
+import threading
+from functools import wraps
+from itertools import islice
+
+from flask import current_app, make_response, request, stream_with_context
 from flask_sqlalchemy import Pagination
 
+from src.app.extensions.flask_json_encoder import json_encoder
+from src.app.extensions.flask_keyset_pagination import KeysetPagination
+from src.app.extensions.lru_cache import LRUCache
+
 EXTENSION_NAME = "flask-response-manager"
 
+STREAM_BATCH_SIZE = 1000
+
+RESPONSE_CACHE_SIZE = 512
+
+CONDITIONAL_METHODS = ('GET', 'HEAD')
+
 
 class ResponseManager(object):
 
     def __init__(self, app=None):
 
-        self.response = None
-        self.status_code = None
-        self.errors = None
+        # Per worker response cache, entries of invalidated tags become unreachable
+        # because the tag generations are part of the cache key.
+        self.cache = LRUCache(maxsize=RESPONSE_CACHE_SIZE)
+        self.tag_generations = {}
+        self._lock = threading.Lock()
 
         if app is not None:
             self.init_app(app)
 
     def init_app(self, app: 'Flask'):
         self.app = app
+        self.cache.maxsize = app.config.get('RESPONSE_CACHE_SIZE',
+                                            RESPONSE_CACHE_SIZE)
 
         app.extensions = getattr(app, "extensions", {})
         app.extensions[EXTENSION_NAME] = self
 
-        @app.teardown_appcontext
-        def teardown_response_service(response_or_exc):  # pylint: disable=unused-variable
-            self.reset()
-            return response_or_exc
+    def build(self,
+              data,
+              code: int = None,
+              pagination: 'Pagination | KeysetPagination' = None,
+              version=None):
+        """Build the {data, errors} json response.
+
+        GET and HEAD responses get an ETag, taken from the version key when given or
+        hashed from the body otherwise, and a matching If-None-Match turns them into a 304.
 
-    def build(self, data, code: int = None, pagination: Pagination = None):
+        :param data: The response data.
+        :param code: Status code, defaults to the one of the request method.
+        :param pagination: A Pagination or KeysetPagination rendered under 'pagination'.
+        :param version: A cheap key that changes whenever data does (e.g. the last updated_at).
+        :returns: A response and its status code.
+        """
         _response = {}
         _response['data'] = data
         _response['errors'] = None
         if pagination:
             _response['pagination'] = self.build_pagination(pagination)
-        self.response = make_response(jsonify(_response))
-        return self.response, self.set_status_code(code)
+        return self.make_conditional(json_encoder().response(_response),
+                                     self.set_status_code(code),
+                                     version=version)
+
+    def make_conditional(self, response, code: int, version=None):
+        """Add an ETag to a successful GET response and answer 304 when the client has it."""
+        etag_mode = current_app.config.get('RESPONSE_ETAG', 'strong')
+
+        if not etag_mode or request.method not in CONDITIONAL_METHODS \
+                or code != 200:
+            return response, code
+
+        if version is not None:
+            response.set_etag(self.version_etag(version), weak=True)
+        else:
+            response.set_etag(
+                hashlib.blake2b(response.get_data(), digest_size=16).hexdigest(),
+                weak=etag_mode == 'weak')
+
+        response.make_conditional(request.environ)
+        return response, response.status_code
+
+    @staticmethod
+    def version_etag(version) -> str:
+        return hashlib.blake2b(str(version).encode('utf-8'),
+                               digest_size=16).hexdigest()
+
+    def not_modified(self, version):
+        """Answer 304 before querying or serializing anything when the client
+        already has this version.
+        :param version: The same version key later passed to build.
+        :returns: A 304 response or None when the client copy is stale.
+        """
+        if request.method not in CONDITIONAL_METHODS:
+            return None
+
+        etag = self.version_etag(version)
+        if not request.if_none_match.contains_weak(etag):
+            return None
+
+        response = current_app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+
+    def cache_control(self, **directives):
+        """Set the Cache-Control policy of a route.
+
+            @ResponseManager.cache_control(max_age=60, private=True)
+
+        :param directives: werkzeug ResponseCacheControl attributes and their values.
+        """
+
+        def wrapper(func):
+
+            @wraps(func)
+            def inner_wrapper(*args, **kwargs):
+                response = make_response(func(*args, **kwargs))
+                for directive, value in directives.items():
+                    setattr(response.cache_control, directive, value)
+                return response
+
+            return inner_wrapper
+
+        return wrapper
+
+    def cached(self,
+               ttl: int = 60,
+               tags: tuple = (),
+               vary: tuple = ('Authorization', )):
+        """Keep successful GET responses of a route in the per worker cache.
+
+            @ResponseManager.cached(ttl=30, tags=('users', ))
+
+        :param ttl: Seconds a response is served from the cache.
+        :param tags: Names passed to invalidate to drop the cached responses.
+        :param vary: Request headers that are part of the cache key.
+
+        Requests sending cookies are not cached since a session may personalize the response,
+        and Set-Cookie headers are never stored.
+        """
+
+        def wrapper(func):
+
+            @wraps(func)
+            def inner_wrapper(*args, **kwargs):
+                if request.method not in CONDITIONAL_METHODS or request.cookies:
+                    return func(*args, **kwargs)
+
+                key = (
+                    request.full_path,
+                    tuple(request.headers.get(header) for header in vary),
+                    tuple(self.tag_generations.get(tag, 0) for tag in tags),
+                )
+                entry = self.cache.get(key)
+
+                if entry is None:
+                    response = make_response(func(*args, **kwargs))
+                    if response.status_code == 200 and not response.is_streamed:
+                        headers = response.headers.copy()
+                        headers.remove('Set-Cookie')
+                        self.cache.set(key, (response.get_data(), headers), ttl=ttl)
+                    return response
+
+                body, headers = entry
+                response = current_app.response_class(body, headers=headers)
+                response.make_conditional(request.environ)
+                return response
+
+            return inner_wrapper
+
+        return wrapper
+
+    def invalidate(self, *tags):
+        """Drop the cached responses of the given tags, or every cached response without tags."""
+        if not tags:
+            self.cache.clear()
+            return
+
+        with self._lock:
+            for tag in tags:
+                self.tag_generations[tag] = self.tag_generations.get(tag, 0) + 1
 
     def build_error(self, error, code: int = 500):
         _response = {}
         _response['data'] = None
         _response['errors'] = error
-        self.response = make_response(jsonify(_response))
-        return self.response, code
+        return json_encoder().response(_response), code
+
+    def stream(self,
+               rows,
+               schema=None,
+               code: int = None,
+               ndjson: bool = False,
+               batch_size: int = STREAM_BATCH_SIZE):
+        """Stream a collection without materializing it.
+
+        Rows are read and dumped in batches, so only one batch is kept in memory at a time.
+        The body is either the {data, errors} envelope written as a chunked json array or
+        one json document per line (ndjson).
+
+        :param rows: An iterable or a query, queries are fetched with yield_per(batch_size).
+        :param schema: A marshmallow schema used to dump each batch, rows are sent as they are otherwise.
+        :param code: Status code, defaults to the one of the request method.
+        :param ndjson: Whether to emit application/x-ndjson instead of a json envelope.
+        :param batch_size: How many rows are fetched, dumped and encoded together.
+        :returns: A streamed response and its status code.
+        """
+        if hasattr(rows, 'yield_per'):
+            rows = rows.yield_per(batch_size)
+
+        encoder = json_encoder()
+
+        def batches():
+            iterator = iter(rows)
+            while True:
+                batch = list(islice(iterator, batch_size))
+                if not batch:
+                    return
+                yield schema.dump(batch, many=True) if schema else batch
+
+        def generate_json():
+            yield b'{"data":['
+            separator = b''
+            for batch in batches():
+                # Encode the whole batch at once and drop its brackets
+                yield separator + encoder.dumps(batch)[1:-1]
+                separator = b','
+            yield b'],"errors":null}'
+
+        def generate_ndjson():
+            for batch in batches():
+                yield b''.join(encoder.dumps(row) + b'\n' for row in batch)
+
+        generator = generate_ndjson() if ndjson else generate_json()
+        mimetype = 'application/x-ndjson' if ndjson else 'application/json'
+        response = current_app.response_class(stream_with_context(generator),
+                                              mimetype=mimetype)
+        return response, self.set_status_code(code)
 
     def set_status_code(self, code: int = None):
 
@@ -79,7 +277,11 @@ class ResponseManager(object):
                 'total': pagination.total
             }
 
-    def reset(self):
-        self.response = None
-        self.status_code = None
-        self.errors = None
+        if isinstance(pagination, (KeysetPagination, )):
+
+            return {
+                'next_cursor': pagination.next_cursor,
+                'prev_cursor': pagination.prev_cursor,
+                'per_page': pagination.per_page,
+                'total': pagination.total
+            }
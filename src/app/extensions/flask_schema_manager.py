@@ -1,19 +1,54 @@
 import importlib
+import threading
+from itertools import islice
+
+from flask import current_app, request
+from marshmallow.exceptions import ValidationError
+from sqlalchemy import insert, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import load_only, selectinload
+
+from src.app.extensions.lru_cache import LRUCache
+from src.app.extensions.schema_compiler import compile_dump
 
 EXTENSION_NAME = "flask-schema"
 
+SCHEMAS_MODULE = 'src.app.schemas'
+
+SCHEMA_CACHE_SIZE = 256
+
+BULK_LOAD_BATCH_SIZE = 1000
+
+# Dialects whose insert supports ON CONFLICT
+UPSERT_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+# Per call arguments that must never end up in a shared schema instance, marshmallow-sqlalchemy
+# keeps the instance, session and transient flag on the schema while it loads
+UNCACHED_KWARGS = ('instance', 'context', 'session', 'transient')
+
 
 class SchemaManager(object):
 
     def __init__(self, app=None):
 
         self.errors = {}
+        self.schemas_module = SCHEMAS_MODULE
+        self.schema_classes = {}
+        self.cache = LRUCache(maxsize=SCHEMA_CACHE_SIZE)
+        self._lock = threading.Lock()
 
         if app is not None:
             self.init_app(app)
 
     def init_app(self, app: 'Flask'):
         self.app = app
+        self.schemas_module = app.config.get('SCHEMAS_MODULE', SCHEMAS_MODULE)
+        self.cache.maxsize = app.config.get('SCHEMA_CACHE_SIZE',
+                                            SCHEMA_CACHE_SIZE)
 
         app.extensions = getattr(app, "extensions", {})
         app.extensions[EXTENSION_NAME] = self
@@ -26,28 +61,120 @@ class SchemaManager(object):
     def reset(self):
         pass
 
+    def stats(self) -> dict:
+        """Hit and miss counters of the schema instance cache."""
+        return self.cache.stats()
+
+    def schema_class_for(self, name: str):
+        """Resolve a <name>Schema class from the schemas module, once per name."""
+        schema_class = self.schema_classes.get(name)
+        if schema_class is not None:
+            return schema_class
+
+        with self._lock:
+            schemas_module = importlib.import_module(self.schemas_module)
+            schema_class = getattr(schemas_module, f'{name}Schema', None)
+            if schema_class is None:
+                raise Exception(
+                    f'SchemaError - {name}Schema not found in {self.schemas_module}')
+            self.schema_classes[name] = schema_class
+
+        return schema_class
+
     def schema_for(self, model, name=None, **kwargs):
-        # Get an instance (create one if it doesn't exist)
-        # And then reset it to apply all defaults
+        # Schema instances are cached by class and constructor arguments, so
+        # the fields are only deep-copied the first time a combination is used.
 
         if model is None:
             raise Exception('SchemaError')
 
         model_name = name or type(model).__name__
+        schema_class = self.schema_class_for(model_name)
 
-        schema_class = f'{model_name}Schema'
+        key = cache_key(schema_class, kwargs)
+        if key is None:
+            return schema_class(**kwargs)
 
-        schemas_module = importlib.import_module('iglobal.schemas')
-        schema = getattr(schemas_module, schema_class)(**kwargs)
+        schema = self.cache.get(key)
+        if schema is None:
+            schema = schema_class(**kwargs)
+            self.cache.set(key, schema)
 
         return schema
 
-    def dump(self, model: object, **kwargs: dict):
-        """Serialize an object"""
+    @staticmethod
+    def sparse_fieldset(fields_arg: str = 'fields', include_arg: str = 'include'):
+        """Read the ?fields= and ?include= comma separated lists of the request.
+
+        Validate them first with the fieldset rule of ValidatorEngine.query_string.
+
+        :returns: A (fields, include, only) tuple, only is the value for the schema only=
+            argument or None when every field was requested.
+        """
+
+        def split(arg):
+            value = request.args.get(arg) or ''
+            return tuple(name.strip() for name in value.split(',') if name.strip())
+
+        fields = split(fields_arg)
+        include = split(include_arg)
+        only = fields + tuple(name for name in include if name not in fields) \
+            if fields else None
+
+        return fields, include, only
+
+    @staticmethod
+    def project(query, model, fields=(), include=()):
+        """Load only the requested columns and eager load the included relationships.
+
+        The projection is skipped when a field is not a mapped column or relationship,
+        since computed fields may read columns that would otherwise be lazy loaded per row.
+
+        :param query: A query on model.
+        :param model: The mapped class.
+        :param fields: Requested attribute names, all of them when empty.
+        :param include: Relationship names eager loaded with selectinload.
+        :returns: The query with its loader options.
+        """
+        mapper = inspect(model)
+        options = []
+
+        columns = [name for name in fields if name in mapper.column_attrs]
+        if columns and all(name in mapper.column_attrs or name in mapper.relationships
+                           for name in fields):
+            options.append(load_only(*[getattr(model, name) for name in columns]))
+
+        for name in include:
+            if name in mapper.relationships:
+                options.append(selectinload(getattr(model, name)))
+
+        return query.options(*options) if options else query
+
+    def dumper_for(self, model, name=None, **kwargs):
+        """Return a compiled dump function for the schema of a model, cached like the schema."""
+        schema = self.schema_for(model, name=name, **kwargs)
+        key = cache_key(type(schema), kwargs)
+        if key is None:
+            return schema.dump
+
+        key = ('dumper', ) + key
+        dumper = self.cache.get(key)
+        if dumper is None:
+            dumper = compile_dump(schema)
+            self.cache.set(key, dumper)
+
+        return dumper
+
+    def dump(self, model: object, compiled: bool = False, **kwargs: dict):
+        """Serialize an object
+        :param compiled: Use a function generated for the schema fields instead of
+            marshmallow's per field dispatch, the output is the same.
+        """
+        if compiled:
+            return self.dumper_for(model, **kwargs)(model)
         return self.schema_for(model, **kwargs).dump(model)
 
     def load(self, payload, name=None, **kwargs):
-        schema = self.schema_for(payload, name=name, **kwargs)
         # kwargs 'many', 'partial' or 'unknown' must to be passed to load
         load_kwargs = {
             key: value
@@ -58,8 +185,149 @@ class SchemaManager(object):
                 'unknown',
             )
         }
-
-        if kwargs.get('context'):
-            schema.context = kwargs.get('context')
+        # A call with an instance gets its own schema, see UNCACHED_KWARGS
+        schema = self.schema_for(payload, name=name, **kwargs)
 
         return schema.load(payload, **load_kwargs)
+
+    def bulk_load(self,
+                  payloads,
+                  model,
+                  name: str = None,
+                  session=None,
+                  batch_size: int = None,
+                  on_conflict: str = None,
+                  index_elements: list = None,
+                  update_columns: list = None) -> dict:
+        """Validate payloads in chunks and write them with multi row Core inserts.
+
+        Each chunk is loaded with the model schema (as dictionaries, no ORM instances), its
+        valid rows are inserted with one executemany per set of keys and the chunk is committed,
+        so a failure only loses the chunk being written. Nested relationships are not written.
+
+        :param payloads: An iterable of dictionaries, it is consumed chunk by chunk.
+        :param model: The mapped class rows are inserted into.
+        :param name: Schema name, defaults to the model name.
+        :param session: Defaults to the Flask-SQLAlchemy session.
+        :param batch_size: Rows per chunk, defaults to BULK_LOAD_BATCH_SIZE.
+        :param on_conflict: None, 'ignore' or 'update' (PostgreSQL and SQLite).
+        :param index_elements: Conflict target columns, defaults to the primary key.
+        :param update_columns: Columns updated on conflict, defaults to the loaded ones.
+        :returns: {'written': int, 'batches': int, 'errors': {index: messages}}
+        """
+        if on_conflict not in (None, 'ignore', 'update'):
+            raise Exception(
+                f"BulkLoadError - Unknown on_conflict {on_conflict}, expecting 'ignore' or 'update'"
+            )
+
+        session = session or current_app.extensions['sqlalchemy'].db.session
+        batch_size = batch_size or current_app.config.get(
+            'BULK_LOAD_BATCH_SIZE', BULK_LOAD_BATCH_SIZE)
+        mapper = inspect(model)
+        columns = {prop.key: prop.columns[0].key for prop in mapper.column_attrs}
+        table = mapper.local_table
+
+        schema_class = self.schema_class_for(name or model.__name__)
+        schema_kwargs = {'many': True}
+        if hasattr(schema_class.opts, 'load_instance'):
+            schema_kwargs['load_instance'] = False
+        schema = self.schema_for(model, name=name or model.__name__,
+                                 **schema_kwargs)
+
+        dialect = session.connection().dialect.name
+        if on_conflict and dialect not in UPSERT_INSERTS:
+            raise Exception(
+                f'BulkLoadError - on_conflict is not supported by {dialect}')
+        insert_func = UPSERT_INSERTS.get(dialect, insert)
+        index_elements = index_elements or [
+            column.key for column in mapper.primary_key
+        ]
+
+        report = {'written': 0, 'batches': 0, 'errors': {}}
+        iterator = iter(payloads)
+        offset = 0
+
+        while True:
+            chunk = list(islice(iterator, batch_size))
+            if not chunk:
+                break
+
+            try:
+                rows = schema.load(chunk)
+                errors = {}
+            except ValidationError as error:
+                errors = error.messages if isinstance(error.messages, dict) \
+                    else {'_schema': error.messages}
+                rows = error.valid_data if isinstance(error.valid_data, list) \
+                    else []
+
+            for index, messages in errors.items():
+                if isinstance(index, int):
+                    report['errors'][offset + index] = messages
+
+            # Rows are grouped by their keys since an executemany shares one statement
+            groups = {}
+            for index, row in enumerate(rows):
+                if index in errors or not isinstance(row, dict):
+                    continue
+                values = {
+                    columns[key]: value
+                    for key, value in row.items() if key in columns
+                }
+                groups.setdefault(tuple(sorted(values)), []).append(
+                    (offset + index, values))
+
+            try:
+                for keys, group in groups.items():
+                    statement = insert_func(table)
+                    if on_conflict == 'ignore':
+                        statement = statement.on_conflict_do_nothing(
+                            index_elements=index_elements)
+                    elif on_conflict == 'update':
+                        statement = statement.on_conflict_do_update(
+                            index_elements=index_elements,
+                            set_={
+                                key: statement.excluded[key]
+                                for key in (update_columns or keys)
+                                if key not in index_elements
+                            })
+                    session.execute(statement, [values for _, values in group])
+                session.commit()
+            except SQLAlchemyError as error:
+                session.rollback()
+                message = str(getattr(error, 'orig', None) or error)
+                for group in groups.values():
+                    for index, _ in group:
+                        report['errors'][index] = {'_schema': [message]}
+            else:
+                report['written'] += sum(len(group) for group in groups.values())
+
+            report['batches'] += 1
+            offset += len(chunk)
+
+        return report
+
+
+def cache_key(schema_class, kwargs: dict):
+    """Key of a schema instance, None when it must not be shared."""
+    if any(key in kwargs for key in UNCACHED_KWARGS):
+        return None
+
+    try:
+        key = (schema_class, freeze(kwargs))
+        hash(key)
+    except TypeError:
+        return None
+
+    return key
+
+
+def freeze(value):
+    """Turn schema arguments into a hashable cache key."""
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
@@ -1,12 +1,55 @@
 # pylint: disable=unused-argument
 import re
 from datetime import datetime
-from functools import wraps
-from flask import request
-from werkzeug.exceptions import HTTPException
+from functools import partial, wraps
+from flask import current_app, request
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
 
 EXTENSION_NAME = "flask-validator-engine"
 
+VALIDATION_TYPES = ('json', 'query_string', 'headers', 'files')
+
+EMAIL_REGEX = re.compile(r'^[a-z0-9]+[\._]?[a-z0-9]+[@]\w+[.]\w{2,3}$')
+
+# Documented rule names that map to a differently named Validators method
+RULE_ALIASES = {
+    'date_after': 'after',
+    'date_after_or_equal': 'after_or_equal',
+    'date_before': 'before',
+    'date_before_or_equal': 'before_or_equal',
+}
+
+DEFAULT_MAX_BODY_SIZE = 1024 * 1024
+
+DEFAULT_MAX_DEPTH = 32
+
+# Json strings are matched whole so brackets inside them are not counted as nesting
+JSON_NESTING_REGEX = re.compile(
+    rb'"[^"\\]*(?:\\.[^"\\]*)*"|(?P<open>[\[{])|(?P<close>[\]}])', re.DOTALL)
+
+DATE_RULES = ('date', 'after', 'after_or_equal', 'before', 'before_or_equal')
+
+# (min, max) arguments of each rule, None is no maximum
+RULE_ARGUMENTS = {
+    'required': (0, 0),
+    'max': (1, 1),
+    'min': (1, 1),
+    'alpha': (0, 0),
+    'alphanumeric': (0, 0),
+    'email': (0, 0),
+    'integer': (0, 0),
+    'float': (0, 0),
+    'list': (0, 1),
+    'fieldset': (1, None),
+    'boolean': (0, 0),
+    'regex': (1, 1),
+    'date': (1, 2),
+    'after': (2, 2),
+    'after_or_equal': (2, 2),
+    'before': (2, 2),
+    'before_or_equal': (2, 2),
+}
+
 
 class ValidatorEngine(object):
     """ Flask ValidatorEngine is an extension to validate flask request data.
@@ -60,6 +103,14 @@ class ValidatorEngine(object):
                     'abc-123-XYZ': [r'regex:[\\w\\d\\-]+']
                 })
 
+        >>> fieldset: This check that the input under validation is a comma separated list of the names allowed.
+            Empty values pass, it is meant for the sparse fieldsets read by SchemaManager.sparse_fieldset
+
+                @validator('query_string', {
+                    'fields': ['fieldset:id,name,email'],
+                    'include': ['fieldset:posts']
+                })
+
         >>> date: This check that the input under validation is a date that matches the <format> provided.
 
                 @validator('json', {
@@ -94,13 +145,28 @@ class ValidatorEngine(object):
                     'expiry_date': ['date_after_or_equal:%Y/%m/%d %H:%M:%S,2020/01/01 01:02:45']
                 })
 
+    Rules are compiled into a ValidationPlan when the decorator is applied: validator functions are
+    resolved, regex patterns compiled and date limits parsed once, so an unknown rule or a malformed
+    argument raises when the route module is imported and not on every request.
+
+    Json bodies larger than VALIDATOR_MAX_BODY_SIZE bytes or nested deeper than VALIDATOR_MAX_DEPTH
+    levels are rejected before being parsed. Passing fail_fast=True stops at the first failing field.
+
+    Json arrays are validated as a whole passing many=True, each rule runs once per field over the
+    column of values and errors are returned per item index.
+
+                @validator('json', {
+                    'email': ['required', 'email']
+                }, many=True)
+
+    The engine keeps no state between requests: errors are collected per call and raised within the
+    ValidationError, so a single instance can be shared by threaded or async workers.
+
     @credits https://github.com/adekoder/flask-validator
     """
 
     def __init__(self, app=None):
 
-        self.errors = {}
-
         if app is not None:
             self.init_app(app)
 
@@ -110,52 +176,39 @@ class ValidatorEngine(object):
         app.extensions = getattr(app, "extensions", {})
         app.extensions[EXTENSION_NAME] = self
 
-        @app.teardown_appcontext
-        def teardown_response_service(response_or_exc):  # pylint: disable=unused-variable
-            self.reset()
-            return response_or_exc
+    def __call__(self, validation_type, rules, many=False, fail_fast=False):
+        if validation_type not in VALIDATION_TYPES:
+            raise Exception(
+                f'AttributeError {validation_type} passed, expecting json or files or query_string or headers'
+            )
 
-    def reset(self):
-        """ Empty errors dictionary"""
-        self.errors = {}
+        if many and validation_type != 'json':
+            raise Exception(
+                f'AttributeError many=True is only supported for json, {validation_type} passed'
+            )
 
-    def __call__(self, validation_type, rules):
+        plan = compile_rules(rules, many=many, fail_fast=fail_fast)
 
         def wrapper(func):
 
             @wraps(func)
             def inner_wrapper(*args, **kwargs):
-                try:
-                    validation_type_method = self.__getattribute__(
-                        validation_type)
-                    all_validation_passes = validation_type_method(rules)
-                    if not all_validation_passes:
-                        return self.response()
-                    return func(*args, **kwargs)
-                except AttributeError:
-                    raise Exception(
-                        f'AttributeError {validation_type} passed, expecting json or form_data or query_string or headers'
-                    ) from AttributeError
+                errors = self.validation_errors(self.request_data(validation_type), plan)
+                if errors:
+                    return self.response(errors)
+                return func(*args, **kwargs)
 
             return inner_wrapper
 
         return wrapper
 
     def check_values(self, data, validation_rules):
-        for field, rules in validation_rules.items():
-            for rule in rules:
-                validator_name, validator_args = self.rule_splitter(rule)
-                try:
-                    validation_result = getattr(Validators, validator_name)(
-                        data.get(field, None), *validator_args)
-                except KeyError:
-                    raise Exception(
-                        f"{validator_name} - Built-in validator specified not known"
-                    ) from KeyError
+        if not isinstance(validation_rules, ValidationPlan):
+            validation_rules = compile_rules(validation_rules)
 
-                if not validation_result['status']:
-                    self.add_error(field, validation_result['message'])
-                    break
+        if validation_rules.many:
+            return validation_rules.run_many(data)
+        return validation_rules.run(data)
 
     @staticmethod
     def rule_splitter(data):
@@ -167,8 +220,56 @@ class ValidatorEngine(object):
             rules[1], ) if validator == 'regex' else rules[1].split(','))
         return validator, args
 
+    def request_data(self, validation_type):
+        """Request data checked by a validation type: json, query_string, headers or files."""
+        if validation_type == 'json':
+            return self.load_json()
+        if validation_type == 'query_string':
+            return request.args.to_dict()
+        if validation_type == 'headers':
+            return request.headers
+        return request.files.to_dict()
+
     def json(self, rules):
-        return self.validate(request.get_json(force=True), rules)
+        return self.validate(self.load_json(), rules)
+
+    @staticmethod
+    def load_json():
+        """Read the json body rejecting it before parsing when it is too large or too deeply nested.
+        :exception: werkzeug.exceptions.RequestEntityTooLarge: When the body exceeds VALIDATOR_MAX_BODY_SIZE
+        :exception: ValidationError: When the body nesting exceeds VALIDATOR_MAX_DEPTH
+        :returns: The parsed json payload.
+        """
+        max_body_size = current_app.config.get('VALIDATOR_MAX_BODY_SIZE',
+                                               DEFAULT_MAX_BODY_SIZE)
+        max_depth = current_app.config.get('VALIDATOR_MAX_DEPTH',
+                                           DEFAULT_MAX_DEPTH)
+        content_length = request.content_length
+
+        if max_body_size and content_length is not None \
+                and content_length > max_body_size:
+            raise RequestEntityTooLarge()
+
+        # A chunked body is read up to one byte past the limit and cached the way
+        # get_data(cache=True) does, so the view reads the same body with get_json.
+        if max_body_size and content_length is None:
+            data = request.stream.read(max_body_size + 1)
+            if len(data) > max_body_size:
+                raise RequestEntityTooLarge()
+            request._cached_data = data  # pylint: disable=protected-access
+        else:
+            data = request.get_data(cache=True)
+
+        if max_depth and not check_depth(data, max_depth):
+            raise ValidationError(
+                messages={
+                    '_schema': [
+                        f'This payload must not be nested deeper than {max_depth} levels'
+                    ]
+                },
+                description='Validation errors')
+
+        return request.get_json(force=True)
 
     def query_string(self, rules):
         return self.validate(request.args.to_dict(), rules)
@@ -180,18 +281,16 @@ class ValidatorEngine(object):
         return self.validate(request.files.to_dict(), rules)
 
     def validate(self, data, rules):
-        self.check_values(data, rules)
-        return not self.has_errors()
-
-    def response(self):
-        raise ValidationError(messages=self.errors,
-                              description='Validation errors')
+        """Whether data passes the rules, validation_errors tells which fields fail."""
+        return not self.validation_errors(data, rules)
 
-    def add_error(self, field, message):
-        self.errors[field] = [message]
+    def validation_errors(self, data, rules):
+        """Validate data returning the errors found, an empty dictionary means it is valid."""
+        return self.check_values(data, rules)
 
-    def has_errors(self):
-        return True if self.errors else False
+    @staticmethod
+    def response(errors=None):
+        raise ValidationError(messages=errors or {}, description='Validation errors')
 
 
 class Validators():
@@ -259,9 +358,8 @@ class Validators():
     @staticmethod
     def email(request_data, *validator_args):
         error_msg = 'This field must contain a valid email address'
-        regex = r'^[a-z0-9]+[\._]?[a-z0-9]+[@]\w+[.]\w{2,3}$'
 
-        if not re.search(regex, request_data):
+        if not EMAIL_REGEX.search(request_data):
             return {'status': False, 'message': error_msg}
         return {'status': True}
 
@@ -292,6 +390,21 @@ class Validators():
 
         return {'status': True}
 
+    @staticmethod
+    def fieldset(request_data, *validator_args):
+        error_msg = 'This field must be a comma separated list of: {args}'.format(
+            args=', '.join(validator_args))
+
+        if request_data in (None, ''):
+            return {'status': True}
+
+        if not isinstance(request_data, str) or any(
+                name.strip() not in validator_args
+                for name in request_data.split(',')):
+            return {'status': False, 'message': error_msg}
+
+        return {'status': True}
+
     @staticmethod
     def boolean(request_data, *validator_arg):  # pylint: disable=unused-argument
         error_msg = 'This field must be a boolean value (True/False) or (1/0)'
@@ -307,13 +420,10 @@ class Validators():
         error_msg = 'This field does not match required pattern'
         pattern = validator_arg[0]
 
-        if hasattr(re, 'fullmatch'):
-            match = re.fullmatch(pattern, request_data)
-        elif not (pattern.startswith('^') and pattern.endswith('$')):
-            pattern = '{}{}{}'.format('^', pattern, '$')
-            match = re.match(pattern, request_data)
-        else:
-            match = re.match(pattern, request_data)
+        if isinstance(pattern, str):
+            pattern = re.compile(pattern)
+
+        match = pattern.fullmatch(request_data)
 
         return {
             'status': True
@@ -328,11 +438,11 @@ class Validators():
             .format(arg=args[0])
         try:
             date_value_1 = datetime.strptime(request_data, args[0])
-        except ValueError:
+        except (TypeError, ValueError):
             return {'status': False, 'message': error_msg}
 
-        if len(args) == 2:
-            date_value_2 = datetime.strptime(args[1], args[0])
+        if len(args) >= 2:
+            date_value_2 = date_limit(args)
             if date_value_1 != date_value_2:
                 error_msg += 'and value must be {arg}'.format(arg=args[1])
                 return {'status': False, 'message': error_msg}
@@ -341,7 +451,7 @@ class Validators():
 
     @staticmethod
     def after(request_data, *args):
-        if len(args) != 2:
+        if len(args) < 2:
             raise Exception(
                 'ArgumentError - Usage should be date_after:<format>,<value>')
 
@@ -350,11 +460,11 @@ class Validators():
 
         try:
             date_value_1 = datetime.strptime(request_data, args[0])
-        except ValueError:
+        except (TypeError, ValueError):
             return {'status': False, 'message':            \
                 'This field must be a date that match this format'.format(arg=args[0])}
 
-        date_value_2 = datetime.strptime(args[1], args[0])
+        date_value_2 = date_limit(args)
         if date_value_1 <= date_value_2:
             return {'status': False, 'message': error_msg}
 
@@ -362,7 +472,7 @@ class Validators():
 
     @staticmethod
     def after_or_equal(request_data, *args):
-        if len(args) != 2:
+        if len(args) < 2:
             raise Exception(
                 'ArgumentError Usage should be date_after_or_equal:<format>,<value>'
             )
@@ -372,11 +482,11 @@ class Validators():
 
         try:
             date_value_1 = datetime.strptime(request_data, args[0])
-        except ValueError:
+        except (TypeError, ValueError):
             return {'status': False, 'message':            \
                 'This field must be a date that match this format'.format(arg=args[0])}
 
-        date_value_2 = datetime.strptime(args[1], args[0])
+        date_value_2 = date_limit(args)
         if date_value_1 < date_value_2:
             return {'status': False, 'message': error_msg}
 
@@ -384,7 +494,7 @@ class Validators():
 
     @staticmethod
     def before(request_data, *args):
-        if len(args) != 2:
+        if len(args) < 2:
             raise Exception(
                 'ArgumentError - Usage should be date_before:<format>,<value>')
 
@@ -393,11 +503,11 @@ class Validators():
 
         try:
             date_value_1 = datetime.strptime(request_data, args[0])
-        except ValueError:
+        except (TypeError, ValueError):
             return {'status': False, 'message':            \
                 'This field must be a date that match this format'.format(arg=args[0])}
 
-        date_value_2 = datetime.strptime(args[1], args[0])
+        date_value_2 = date_limit(args)
         if date_value_1 >= date_value_2:
             return {'status': False, 'message': error_msg}
 
@@ -405,7 +515,7 @@ class Validators():
 
     @staticmethod
     def before_or_equal(request_data, *args):
-        if len(args) != 2:
+        if len(args) < 2:
             raise Exception(
                 'ArgumentError - Usage should be date_before_or_equal:<format>,<value>'
             )
@@ -415,17 +525,320 @@ class Validators():
 
         try:
             date_value_1 = datetime.strptime(request_data, args[0])
-        except ValueError:
+        except (TypeError, ValueError):
             return {'status': False, 'message':            \
                 'This field must be a date that match this format'.format(arg=args[0])}
 
-        date_value_2 = datetime.strptime(args[1], args[0])
+        date_value_2 = date_limit(args)
         if date_value_1 > date_value_2:
             return {'status': False, 'message': error_msg}
 
         return {'status': True}
 
 
+class BatchValidators():
+    """Column versions of Validators, they return whether each of the values passes the rule."""
+
+    @staticmethod
+    def required(values, *validation_args):  # pylint: disable=unused-argument
+        return [value not in (None, '') for value in values]
+
+    @staticmethod
+    def max(values, *validator_args):
+        limit = int(validator_args[0])
+        return [(value if isinstance(value, int) else len(value)) <= limit
+                for value in values]
+
+    @staticmethod
+    def min(values, *validator_args):
+        limit = int(validator_args[0])
+        return [(value if isinstance(value, int) else len(value)) >= limit
+                for value in values]
+
+    @staticmethod
+    def alpha(values, *validator_args):  # pylint: disable=unused-argument
+        return [value.isalpha() for value in values]
+
+    @staticmethod
+    def alphanumeric(values, *validator_args):  # pylint: disable=unused-argument
+        return [value.isalnum() for value in values]
+
+    @staticmethod
+    def email(values, *validator_args):  # pylint: disable=unused-argument
+        search = EMAIL_REGEX.search
+        return [search(value) is not None for value in values]
+
+    @staticmethod
+    def integer(values, *validator_args):  # pylint: disable=unused-argument
+        return [isinstance(value, int) for value in values]
+
+    @staticmethod
+    def float(values, *validator_args):  # pylint: disable=unused-argument
+        return [isinstance(value, float) for value in values]
+
+    @staticmethod
+    def list(values, *validator_args):
+        length = validator_args[0] if validator_args else None
+        return [
+            isinstance(value, list) and not (length and len(value) != length)
+            for value in values
+        ]
+
+    @staticmethod
+    def boolean(values, *validator_args):  # pylint: disable=unused-argument
+        return [
+            isinstance(value, bool) or value == 0 or value == 1
+            for value in values
+        ]
+
+    @staticmethod
+    def regex(values, *validator_args):
+        pattern = validator_args[0]
+        if isinstance(pattern, str):
+            pattern = re.compile(pattern)
+        fullmatch = pattern.fullmatch
+        return [fullmatch(value) is not None for value in values]
+
+    @staticmethod
+    def date(values, *args):
+        dates = parse_dates(values, args[0])
+        if len(args) < 2:
+            return [value is not None for value in dates]
+        limit = date_limit(args)
+        return [value is not None and value == limit for value in dates]
+
+    @staticmethod
+    def after(values, *args):
+        limit = date_limit(args)
+        return [
+            value is not None and value > limit
+            for value in parse_dates(values, args[0])
+        ]
+
+    @staticmethod
+    def after_or_equal(values, *args):
+        limit = date_limit(args)
+        return [
+            value is not None and value >= limit
+            for value in parse_dates(values, args[0])
+        ]
+
+    @staticmethod
+    def before(values, *args):
+        limit = date_limit(args)
+        return [
+            value is not None and value < limit
+            for value in parse_dates(values, args[0])
+        ]
+
+    @staticmethod
+    def before_or_equal(values, *args):
+        limit = date_limit(args)
+        return [
+            value is not None and value <= limit
+            for value in parse_dates(values, args[0])
+        ]
+
+
+class ValidationPlan(object):
+    """Validation rules compiled into (field, ((validator, args, batch_validator), ...)) steps."""
+
+    __slots__ = ('fields', 'many', 'fail_fast')
+
+    def __init__(self, fields, many=False, fail_fast=False):
+        self.fields = fields
+        self.many = many
+        self.fail_fast = fail_fast
+
+    def run(self, data):
+        """Check data against every field and return the errors found.
+        :param data: A mapping with the request data.
+        :returns: A dictionary with the first error message of each failing field.
+        """
+        errors = {}
+        get_value = data.get
+
+        for field, steps in self.fields:
+            value = get_value(field, None)
+            for validator_func, validator_args, _ in steps:
+                validation_result = validator_func(value, *validator_args)
+                if not validation_result['status']:
+                    errors[field] = [validation_result['message']]
+                    if self.fail_fast:
+                        return errors
+                    break
+
+        return errors
+
+    def run_many(self, items):
+        """Check a list of objects field by field, running each rule once over the whole column.
+        :param items: A list with the request objects.
+        :returns: A dictionary with the errors of each failing item keyed by its index.
+        """
+        if not isinstance(items, list):
+            return {'_schema': ['This payload must be a list']}
+
+        errors = {}
+        rows = []
+        for index, item in enumerate(items):
+            if isinstance(item, dict):
+                rows.append((index, item))
+            else:
+                errors[index] = {'_schema': ['This item must be an object']}
+
+        for field, steps in self.fields:
+            indexes = [index for index, _ in rows]
+            values = [item.get(field, None) for _, item in rows]
+
+            for validator_func, validator_args, batch_func in steps:
+                if not values:
+                    break
+
+                passes = batch_func(values, *validator_args)
+                if all(passes):
+                    continue
+
+                # Only failing values go through the validator again to build the same message
+                passed_indexes, passed_values = [], []
+                for index, value, passed in zip(indexes, values, passes):
+                    if passed:
+                        passed_indexes.append(index)
+                        passed_values.append(value)
+                    else:
+                        validation_result = validator_func(value, *validator_args)
+                        errors.setdefault(index, {})[field] = [
+                            validation_result['message']
+                        ]
+                        if self.fail_fast:
+                            return errors
+                indexes, values = passed_indexes, passed_values
+
+        return errors
+
+
+def compile_rules(rules, many=False, fail_fast=False):
+    """Compile a {field: [rules]} dictionary into a ValidationPlan.
+    :param rules: The validation rules passed to the validator decorator.
+    :param many: Whether the plan validates a list of objects.
+    :param fail_fast: Whether to stop at the first error found.
+    :exception: Exception: When a rule is unknown or its arguments are malformed.
+    :returns: A ValidationPlan.
+    """
+    fields = tuple((field, tuple(compile_rule(rule) for rule in field_rules))
+                   for field, field_rules in rules.items())
+    return ValidationPlan(fields, many=many, fail_fast=fail_fast)
+
+
+def compile_rule(rule):
+    """Resolve a rule string into a validator function and its prepared arguments."""
+    validator_name, validator_args = ValidatorEngine.rule_splitter(rule)
+    validator_name = RULE_ALIASES.get(validator_name, validator_name)
+
+    # Only the validators themselves, not the other attributes of the class (e.g. mro)
+    if not isinstance(Validators.__dict__.get(validator_name), staticmethod):
+        raise Exception(
+            f"{validator_name} - Built-in validator specified not known")
+    validator_func = getattr(Validators, validator_name)
+
+    if isinstance(BatchValidators.__dict__.get(validator_name), staticmethod):
+        batch_func = getattr(BatchValidators, validator_name)
+    else:
+        batch_func = partial(batch_fallback, validator_func)
+
+    return validator_func, prepare_args(validator_name,
+                                        tuple(validator_args)), batch_func
+
+
+def batch_fallback(validator_func, values, *validator_args):
+    """Run a validator without a column version over each one of the values."""
+    return [
+        validator_func(value, *validator_args)['status'] for value in values
+    ]
+
+
+def prepare_args(validator_name, validator_args):
+    """Convert rule arguments into the values the validators compare against.
+    :exception: Exception: When the number of arguments or their values are wrong.
+    """
+    minimum, maximum = RULE_ARGUMENTS.get(validator_name, (0, None))
+    if len(validator_args) < minimum or (maximum is not None and len(validator_args) > maximum):
+        if validator_name in DATE_RULES and validator_name != 'date':
+            raise Exception(
+                f'ArgumentError - Usage should be date_{validator_name}:<format>,<value>')
+        expected = minimum if minimum == maximum else \
+            f'{minimum} to {maximum}' if maximum is not None else f'at least {minimum}'
+        raise Exception(
+            f'ArgumentError - {validator_name} takes {expected} argument(s), '
+            f'got {len(validator_args)}')
+
+    if validator_name in ('max', 'min', 'list') and validator_args:
+        try:
+            return (int(validator_args[0]), )
+        except ValueError:
+            raise Exception(
+                f'ArgumentError - {validator_name} expects an integer, got {validator_args[0]!r}'
+            ) from ValueError
+
+    if validator_name == 'regex':
+        try:
+            return (re.compile(validator_args[0]), )
+        except re.error as error:
+            raise Exception(
+                f'ArgumentError - regex expects a valid pattern, {error}') from error
+
+    if validator_name in DATE_RULES:
+        if len(validator_args) == 2:
+            date_format, date_value = validator_args
+            return date_format, date_value, datetime.strptime(
+                date_value, date_format)
+
+    return validator_args
+
+
+def check_depth(data, max_depth):
+    """Check that a raw json document does not nest objects or arrays deeper than max_depth."""
+    # There can not be more levels than opening brackets
+    if data.count(b'{') + data.count(b'[') <= max_depth:
+        return True
+
+    depth = 0
+    for token in JSON_NESTING_REGEX.finditer(data):
+        kind = token.lastgroup
+        if kind == 'open':
+            depth += 1
+            if depth > max_depth:
+                return False
+        elif kind == 'close':
+            depth -= 1
+
+    return True
+
+
+def parse_dates(values, date_format):
+    """Parse a column of dates once per distinct value, None marks the ones not matching the format."""
+    parsed = {}
+    dates = []
+    for value in values:
+        # Missing fields, numbers, lists... are not dates and may not be hashable
+        if not isinstance(value, str):
+            dates.append(None)
+            continue
+        if value not in parsed:
+            try:
+                parsed[value] = datetime.strptime(value, date_format)
+            except (TypeError, ValueError):
+                parsed[value] = None
+        dates.append(parsed[value])
+    return dates
+
+
+def date_limit(args):
+    """Return the bound date of a date rule, parsing it only when it was not precompiled."""
+    if len(args) > 2:
+        return args[2]
+    return datetime.strptime(args[1], args[0])
+
+
 class ValidationError(HTTPException):
 
     def __init__(self,
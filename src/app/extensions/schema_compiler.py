@@ -0,0 +1,95 @@
+from marshmallow import Schema, fields
+from marshmallow.decorators import POST_DUMP, PRE_DUMP
+from marshmallow.utils import ensure_text_type, missing
+
+# Field types whose _serialize is inlined, the expression receives the attribute value as v
+INLINE_SERIALIZERS = {
+    fields.String: 'v if v.__class__ is str else (None if v is None else ensure_text_type(v))',
+    fields.Integer: 'v if v.__class__ is int else (None if v is None else int(v))',
+    fields.Float: 'v if v.__class__ is float else (None if v is None else float(v))',
+    fields.Raw: 'v',
+}
+
+
+def compile_dump(schema: Schema):
+    """Generate a function that dumps objects exactly like schema.dump does.
+
+    Attributes are read with getattr and the simple field types in INLINE_SERIALIZERS are
+    serialized inline, other fields are called through their own _serialize, and fields that
+    override serialize or get_value go through marshmallow untouched. Missing attributes fall
+    back to Field.serialize so dump defaults are applied the same way.
+
+    Schemas with pre/post dump hooks or a custom get_attribute are not compiled, the returned
+    function is schema.dump itself. Mappings (dicts, rows) are also dumped by marshmallow since
+    they are read with [] instead of getattr.
+
+    :param schema: A marshmallow schema instance.
+    :returns: A callable taking the object, or the list of objects for a many schema.
+    """
+    if schema._has_processors(PRE_DUMP) or schema._has_processors(POST_DUMP) \
+            or type(schema).get_attribute is not Schema.get_attribute:
+        return schema.dump
+
+    namespace = {
+        'missing': missing,
+        'ensure_text_type': ensure_text_type,
+        'get_attribute': schema.get_attribute,
+        'dict_class': schema.dict_class,
+    }
+    lines = [
+        'def dump_many(objs):',
+        '    result = []',
+        '    append = result.append',
+        '    for obj in objs:',
+        '        d = dict_class()',
+    ]
+
+    for index, (attr_name, field) in enumerate(schema.dump_fields.items()):
+        field_name = f'field_{index}'
+        namespace[field_name] = field
+        key = field.data_key if field.data_key is not None else attr_name
+        attribute = field.attribute if field.attribute is not None else attr_name
+
+        if not field._CHECK_ATTRIBUTE or '.' in attribute \
+                or type(field).serialize is not fields.Field.serialize \
+                or type(field).get_value is not fields.Field.get_value:
+            lines += [
+                f'        v = {field_name}.serialize({attr_name!r}, obj, accessor=get_attribute)',
+                '        if v is not missing:',
+                f'            d[{key!r}] = v',
+            ]
+            continue
+
+        expression = INLINE_SERIALIZERS.get(type(field))
+        if expression is None or getattr(field, 'as_string', False):
+            expression = f'{field_name}._serialize(v, {attr_name!r}, obj)'
+
+        lines += [
+            f'        v = getattr(obj, {attribute!r}, missing)',
+            '        if v is missing:',
+            f'            v = {field_name}.serialize({attr_name!r}, obj, accessor=get_attribute)',
+            '            if v is not missing:',
+            f'                d[{key!r}] = v',
+            '        else:',
+            f'            d[{key!r}] = {expression}',
+        ]
+
+    lines += [
+        '        append(d)',
+        '    return result',
+    ]
+
+    exec(compile('\n'.join(lines), f'<compiled {type(schema).__name__}>', 'exec'),
+         namespace)  # pylint: disable=exec-used
+    dump_many = namespace['dump_many']
+
+    def dump(obj):
+        if obj is None:
+            return schema.dump(obj)
+        objs = list(obj) if schema.many else [obj]
+        if any(hasattr(item, '__getitem__') for item in objs):
+            return schema.dump(objs if schema.many else obj)
+        result = dump_many(objs)
+        return result if schema.many else result[0]
+
+    return dump
@@ -0,0 +1,5 @@
+from src.app.repositories.base_repository import (
+    BaseRepository,
+    BatchLoader,
+    LazyValue,
+)
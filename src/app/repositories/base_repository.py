@@ -0,0 +1,208 @@
+from itertools import islice
+
+from flask import g, has_app_context
+from sqlalchemy import func
+
+from src.app.extensions import ReplicaRouter, db
+from src.app.extensions.flask_query_cache import CACHE_OPTION, mark_changed
+
+CHUNK_SIZE = 500
+
+
+class LazyValue(object):
+    """Value of a key queued in a BatchLoader, reading it dispatches every queued key at once."""
+
+    __slots__ = ('loader', 'key')
+
+    def __init__(self, loader: 'BatchLoader', key):
+        self.loader = loader
+        self.key = key
+
+    def get(self):
+        return self.loader.get(self.key)
+
+
+class BatchLoader(object):
+    """DataLoader style batching and caching of lookups by key.
+
+    load() only queues a key, the first get() fetches all the queued keys with a single
+    batched query and every later lookup of those keys is served from the cache:
+
+        authors = [loader.load(post.author_id) for post in posts]
+        names = [author.get().name for author in authors]  # one query
+
+    :param fetch: Callable receiving a list of keys and returning a {key: value} dict.
+    :param default: Callable building the value of each key missing in the fetch result
+        (e.g. list), missing keys are None without it.
+    """
+
+    def __init__(self, fetch, default=None):
+        self.fetch = fetch
+        self.default = default
+        self.cache = {}
+        self.pending = set()
+
+    def load(self, key) -> LazyValue:
+        if key not in self.cache:
+            self.pending.add(key)
+        return LazyValue(self, key)
+
+    def get(self, key):
+        if key not in self.cache:
+            self.pending.add(key)
+            self.dispatch()
+        return self.cache[key]
+
+    def load_many(self, keys) -> list:
+        """Return the values of keys in order skipping duplicates, fetching the missing ones at once."""
+        keys = list(dict.fromkeys(keys))
+        self.pending.update(key for key in keys if key not in self.cache)
+        self.dispatch()
+        return [self.cache[key] for key in keys]
+
+    def dispatch(self):
+        if not self.pending:
+            return
+
+        keys, self.pending = list(self.pending), set()
+        values = self.fetch(keys)
+        for key in keys:
+            if key in values:
+                self.cache[key] = values[key]
+            else:
+                self.cache[key] = self.default() if self.default is not None else None
+
+    def clear(self):
+        self.cache.clear()
+        self.pending.clear()
+
+
+class BaseRepository(object):
+    """Data access for one model on the shared db session.
+
+    Lookups by id go through a per request BatchLoader, so repeated and batched lookups
+    inside a request hit the database once. Subclasses set model and add their own queries:
+
+        class UserRepository(BaseRepository):
+            model = User
+    """
+
+    model = None
+    chunk_size = CHUNK_SIZE
+
+    def __init__(self, session=None):
+        self._session = session
+
+    @property
+    def session(self):
+        return self._session or db.session
+
+    def query(self):
+        return self.session.query(self.model)
+
+    @staticmethod
+    def cached(query, ttl: int = None):
+        """Serve the query results from the QueryCache until a commit writes its tables.
+        :param ttl: Seconds, defaults to QUERY_CACHE_TTL.
+        """
+        return query.execution_options(**{CACHE_OPTION: ttl or True})
+
+    def replica(self):
+        """Context manager sending the reads of the block to a read replica, for read only
+        calls made during unsafe requests."""
+        return ReplicaRouter.replica(self.session)
+
+    @property
+    def primary_key(self):
+        primary_key = self.model.__mapper__.primary_key
+        if len(primary_key) != 1:
+            raise Exception(
+                f'RepositoryError - {self.model.__name__} must have a single column primary key'
+            )
+        return primary_key[0]
+
+    def loader(self, key: str = None, many: bool = False) -> BatchLoader:
+        """Return the request BatchLoader of the model by a column.
+        :param key: Column name, defaults to the primary key.
+        :param many: Whether a key maps to a list of entities (e.g. posts by author_id).
+        :returns: A loader shared by the whole request, a new one outside of it.
+        """
+        column = getattr(self.model, key) if key else self.primary_key
+
+        def fetch(keys):
+            return self.fetch_by(column, keys, many=many)
+
+        loader_key = (self.model, column.key, many)
+        if not has_app_context():
+            return BatchLoader(fetch, default=list if many else None)
+
+        loaders = g.setdefault('repository_loaders', {})
+        if loader_key not in loaders:
+            loaders[loader_key] = BatchLoader(fetch, default=list if many else None)
+        return loaders[loader_key]
+
+    def clear_loaders(self):
+        """Drop the cached lookups of the model, done after every write."""
+        if has_app_context():
+            for loader_key, loader in g.get('repository_loaders', {}).items():
+                if loader_key[0] is self.model:
+                    loader.clear()
+
+    def fetch_by(self, column, keys, many: bool = False) -> dict:
+        """Query entities whose column is in keys with chunked IN queries.
+        :returns: A {key: entity} dict, or {key: [entities]} when many.
+        """
+        result = {}
+        iterator = iter(keys)
+
+        while True:
+            chunk = list(islice(iterator, self.chunk_size))
+            if not chunk:
+                break
+
+            for entity in self.query().filter(column.in_(chunk)):
+                value = getattr(entity, column.key)
+                if many:
+                    result.setdefault(value, []).append(entity)
+                else:
+                    result[value] = entity
+
+        return result
+
+    def get(self, id):  # pylint: disable=redefined-builtin
+        return self.loader().get(id)
+
+    def load(self, id) -> LazyValue:  # pylint: disable=redefined-builtin
+        """Queue an id returning a LazyValue, queued ids are fetched together."""
+        return self.loader().load(id)
+
+    def get_many(self, ids) -> list:
+        """Return the entities of ids in order, ignoring duplicates and missing ones."""
+        return [entity for entity in self.loader().load_many(ids) if entity is not None]
+
+    def exists(self, **filters) -> bool:
+        return self.session.query(
+            self.query().filter_by(**filters).exists()).scalar()
+
+    def count(self, **filters) -> int:
+        """Count rows without loading entities nor wrapping the query in a subquery."""
+        return self.session.query(func.count(self.primary_key)).select_from(
+            self.model).filter_by(**filters).scalar()
+
+    def bulk_update(self, mappings, batch_size: int = None):
+        """Update rows from dictionaries holding the primary key and the changed columns.
+
+        Rows are written in batches of executemany UPDATE statements without loading
+        entities, the caller commits.
+        """
+        iterator = iter(mappings)
+        batch_size = batch_size or self.chunk_size
+
+        while True:
+            chunk = list(islice(iterator, batch_size))
+            if not chunk:
+                break
+            self.session.bulk_update_mappings(self.model, chunk)
+
+        mark_changed(self.session, self.model.__table__)
+        self.clear_loaders()
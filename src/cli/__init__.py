@@ -1,18 +1,69 @@
+import functools
 import importlib
 import os
 
+import click
+
+
+class LazyCommand(click.Command):
+    """Command registered by name whose module is imported when it is invoked or documented.
+
+    Args:
+        name (str): Command name
+        import_name (str): Module defining the command
+        attribute (str): Name of the command in the module
+    """
+
+    def __init__(self, name, import_name, attribute):
+        super().__init__(name)
+        self.import_name = import_name
+        self.attribute = attribute
+        self._command = None
+
+    @property
+    def command(self) -> click.Command:
+        if self._command is None:
+            module = importlib.import_module(self.import_name)
+            self._command = getattr(module, self.attribute)
+        return self._command
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        return self.command.make_context(info_name, args, parent=parent, **extra)
+
+    def invoke(self, ctx):
+        return self.command.invoke(ctx)
+
+    def get_short_help_str(self, limit=45):
+        return self.command.get_short_help_str(limit)
+
+    def get_help(self, ctx):
+        return self.command.get_help(ctx)
+
+    def get_params(self, ctx):
+        return self.command.get_params(ctx)
+
+
+@functools.lru_cache(maxsize=None)
+def command_modules() -> tuple:
+    """Names of the cmd_*.py modules, listed once per process."""
+    return tuple(
+        sorted(filename[:-3] for filename in os.listdir(os.path.dirname(__file__))
+               if filename.endswith('.py') and filename.startswith('cmd_')))
+
 
 def register_cli_commands(app):
     """Register 0 or more Flask CLI commands. Mutates the app passed in.
 
+    Commands are imported only when they are run, a cmd_<name>.py module
+    must define a <name> command, run as flask <name> with dashes for underscores.
+
     Args:
         app (Flask): Flask application instance
     """
 
-    for filename in os.listdir(os.path.dirname(__file__)):
-        if filename.endswith('.py') and filename.startswith('cmd_'):
-            module = importlib.import_module(f'src.cli.{filename[:-3]}')
-            cmd = getattr(module, filename[4:-3])
-            app.cli.add_command(cmd)
+    for module_name in command_modules():
+        attribute = module_name[4:]
+        app.cli.add_command(
+            LazyCommand(attribute.replace('_', '-'), f'src.cli.{module_name}', attribute))
 
     return None
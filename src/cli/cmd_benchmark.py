@@ -0,0 +1,63 @@
+import datetime
+import timeit
+from decimal import Decimal
+
+import click
+from flask.cli import with_appcontext
+from marshmallow import Schema, fields
+
+from src.app.extensions.schema_compiler import compile_dump
+
+
+class BenchmarkRow(object):
+    """Plain object standing in for a model instance."""
+
+    def __init__(self, index):
+        self.id = index
+        self.name = f'name-{index}'
+        self.email = f'user{index}@example.com'
+        self.score = index * 0.5
+        self.active = bool(index % 2)
+        self.balance = Decimal(index) / 100
+        self.created_at = datetime.datetime(2022, 1, 1) + datetime.timedelta(seconds=index)
+        self.notes = None
+
+
+class BenchmarkRowSchema(Schema):
+    id = fields.Integer()
+    name = fields.String()
+    email = fields.Email()
+    score = fields.Float()
+    active = fields.Boolean()
+    balance = fields.Decimal(as_string=True)
+    created_at = fields.DateTime()
+    notes = fields.String(data_key='comments')
+
+
+@click.command()
+@click.option('--rows', default=10000, help='Rows in the dumped list')
+@click.option('--repeat', default=5, help='Timed runs of each path')
+@with_appcontext
+def benchmark(rows, repeat):
+    """Compare marshmallow and compiled schema dumps of a list of rows.
+
+    Args:
+        rows (int): Rows in the dumped list
+        repeat (int): Timed runs of each path, the best one is reported
+    """
+    objs = [BenchmarkRow(index) for index in range(rows)]
+    schema = BenchmarkRowSchema(many=True)
+    compiled = compile_dump(schema)
+
+    if compiled(objs) != schema.dump(objs):
+        raise click.ClickException('Compiled dump output differs from marshmallow')
+
+    marshmallow_time = min(timeit.repeat(lambda: schema.dump(objs), number=1, repeat=repeat))
+    compiled_time = min(timeit.repeat(lambda: compiled(objs), number=1, repeat=repeat))
+
+    click.echo(f'Schema dump of {rows} rows (best of {repeat})\n-----------------')
+    click.echo(f'marshmallow:\t{marshmallow_time * 1000:.1f} ms')
+    click.echo(f'compiled:\t{compiled_time * 1000:.1f} ms')
+    click.echo(f'speedup:\t{marshmallow_time / compiled_time:.1f}x')
+
+    return None
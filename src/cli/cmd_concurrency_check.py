@@ -0,0 +1,94 @@
+import threading
+import time
+
+import click
+from flask import Flask, request
+
+from src.app.extensions import ResponseManager, validator
+from src.app.extensions.flask_exception_handler import ExceptionHandler
+
+RULES = {
+    'name': ['required', 'alpha'],
+    'age': ['required', 'integer'],
+}
+
+
+def check_app() -> Flask:
+    """App sharing the validator and response manager singletons with the real one."""
+    app = Flask(__name__)
+    app.config.update(TESTING=True, ERROR_TRACEBACK_LIMIT=0)
+    ExceptionHandler(app)
+
+    @app.route('/check', methods=['POST'])
+    @validator('json', RULES)
+    def check():  # pylint: disable=unused-variable
+        payload = request.get_json()
+        # Yield to the other threads between validating and answering
+        time.sleep(0)
+        return ResponseManager.build(payload)
+
+    return app
+
+
+def expected(index: int):
+    """Payload of the index request and what it must be answered with.
+
+    Returns:
+        tuple: (payload, status, failing fields)
+    """
+    kind = index % 3
+    if kind == 0:
+        # Alphabetic name unique to the request, e.g. 123 is bcd
+        name = ''.join(chr(ord('a') + int(digit)) for digit in str(index))
+        return {'name': name, 'age': index}, 201, set()
+    if kind == 1:
+        return {'age': index}, 400, {'name'}
+    return {'name': 'user', 'age': f'age-{index}'}, 400, {'age'}
+
+
+@click.command()
+@click.option('--threads', default=16, help='Concurrent clients')
+@click.option('--requests', 'count', default=2000, help='Requests sent by all the clients')
+def concurrency_check(threads, count):
+    """Send valid and invalid requests from concurrent clients and check no validation errors
+    or responses leak from one request into another.
+
+    Args:
+        threads (int): Concurrent clients
+        count (int): Requests sent by all the clients
+    """
+    app = check_app()
+    failures = []
+    barrier = threading.Barrier(threads)
+
+    def client(offset):
+        test_client = app.test_client()
+        barrier.wait()
+        for index in range(offset, count, threads):
+            payload, status, fields = expected(index)
+            response = test_client.post('/check', json=payload)
+            body = response.get_json() or {}
+            errors = (body.get('errors') or {}).get('details') or {}
+
+            if response.status_code != status or set(errors) != fields \
+                    or (status == 201 and body.get('data') != payload):
+                failures.append((index, payload, response.status_code, body))
+
+    workers = [threading.Thread(target=client, args=(offset, )) for offset in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    click.echo(f'{count} requests over {threads} threads in {elapsed * 1000:.0f} ms')
+    for index, payload, status, body in failures[:10]:
+        click.echo(f'request {index} {payload} answered {status}: {body}')
+
+    if failures:
+        raise click.ClickException(f'{len(failures)} requests got another request result')
+
+    click.echo('No cross-request bleed')
+
+    return None
@@ -0,0 +1,30 @@
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from src.app.extensions.flask_request_profiler import (PROFILER_HEADER,
+                                                       PROFILER_QUERY_ARG,
+                                                       RequestProfiler)
+from src.app.extensions.flask_serializer_manager import \
+    EXTENSION_NAME as SERIALIZER_EXTENSION_NAME
+
+
+@click.command()
+@click.option('--expiration', default=3600, help='Seconds the token is valid')
+@with_appcontext
+def profile_token(expiration):
+    """Generate a token profiling the requests that send it.
+
+    Args:
+        expiration (int): Seconds the token is valid
+    """
+    if SERIALIZER_EXTENSION_NAME not in current_app.extensions:
+        raise click.ClickException('SECRET_KEY and SECRET_KEY_SALT must be set')
+    if not current_app.config.get('PROFILER_ENABLED'):
+        click.echo('Warning: PROFILER_ENABLED is off in this environment', err=True)
+
+    token = RequestProfiler.token(expiration)
+    click.echo(f'{PROFILER_HEADER}: {token}')
+    click.echo(f'?{PROFILER_QUERY_ARG}={token}')
+
+    return None
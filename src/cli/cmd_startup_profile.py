@@ -0,0 +1,81 @@
+import json
+import os
+import subprocess
+import sys
+
+import click
+
+# Run in a fresh interpreter, the current one already imported everything
+PROFILED_STARTUP = '''
+import json, time
+start = time.perf_counter()
+from src.app.factory import create_app
+imported = time.perf_counter()
+create_app({environment!r})
+created = time.perf_counter()
+print(json.dumps({{'import': imported - start, 'create_app': created - imported}}))
+'''
+
+
+def parse_importtime(output: str) -> list:
+    """Parse python -X importtime lines.
+
+    Args:
+        output (str): stderr of the interpreter
+
+    Returns:
+        list: (module, self microseconds, cumulative microseconds) tuples
+    """
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_time, cumulative, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(self_time), int(cumulative)))
+    return modules
+
+
+@click.command()
+@click.option('--top', default=15, help='Modules and packages listed')
+@click.option('--env', 'environment', default=None, help='Settings profile, defaults to FLASK_ENV')
+def startup_profile(top, environment):
+    """Report where the app startup time goes, by package and by module.
+
+    Args:
+        top (int): Modules and packages listed
+        environment (str): Settings profile the app is created with
+    """
+    environment = environment or os.getenv('FLASK_ENV', 'development')
+    env = dict(os.environ, FLASK_ENV=environment)
+    env.pop('FLASK_RUN_FROM_CLI', None)
+
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         PROFILED_STARTUP.format(environment=environment)],
+        capture_output=True, text=True, env=env, check=False)
+    if result.returncode:
+        lines = result.stderr.strip().splitlines()
+        raise click.ClickException(
+            lines[-1] if lines else f'App startup failed with code {result.returncode}')
+
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    modules = parse_importtime(result.stderr)
+
+    packages = {}
+    for name, self_time, _ in modules:
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + self_time
+
+    click.echo(f'Startup of the {environment} app\n-----------------')
+    click.echo(f'imports:\t{timings["import"] * 1000:.1f} ms')
+    click.echo(f'create_app:\t{timings["create_app"] * 1000:.1f} ms')
+
+    click.echo('\nPackages by import time\n-----------------')
+    for package, self_time in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        click.echo(f'{self_time / 1000:8.1f} ms\t{package}')
+
+    click.echo('\nModules by cumulative import time\n-----------------')
+    for name, _, cumulative in sorted(modules, key=lambda item: -item[2])[:top]:
+        click.echo(f'{cumulative / 1000:8.1f} ms\t{name}')
+
+    return None
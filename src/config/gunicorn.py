@@ -1,15 +1,203 @@
 # -*- coding: utf-8 -*-
 # pylint: disable=invalid-name
-import multiprocessing
+import functools
+import gc
+import importlib.util
+import math
 import os
+import sys
 
-from distutils.util import strtobool
+# Worker sizing per profile, GUNICORN_PROFILE defaults to production when FLASK_ENV is
+PROFILES = {
+    'development': {
+        'worker_class': 'sync',
+        'workers_per_cpu': 2,
+        'extra_workers': 0,
+        'threads': 1,
+        'reload': True,
+        'preload_app': False,
+        'max_requests': 0,
+    },
+    'production': {
+        'worker_class': 'sync',
+        'workers_per_cpu': 2,
+        'extra_workers': 1,
+        'threads': 1,
+        'reload': False,
+        'preload_app': True,
+        'max_requests': 2000,
+    },
+    'production-threaded': {
+        'worker_class': 'gthread',
+        'workers_per_cpu': 1,
+        'extra_workers': 1,
+        'threads': 4,
+        'reload': False,
+        'preload_app': True,
+        'max_requests': 2000,
+    },
+}
+
+# Memory budget of a worker used to cap the workers under a cgroup memory limit
+WORKER_MEMORY = int(os.getenv('GUNICORN_WORKER_MEMORY_MB', '256')) * 1024 * 1024
+
+
+def strtobool(value: str) -> bool:
+    """Truthiness of an environment value, distutils.util.strtobool is gone in Python 3.12."""
+    value = str(value).strip().lower()
+    if value in ('y', 'yes', 't', 'true', 'on', '1'):
+        return True
+    if value in ('n', 'no', 'f', 'false', 'off', '0'):
+        return False
+    raise ValueError(f'Invalid truth value {value!r}')
+
+
+def read_file(path: str):
+    try:
+        with open(path, encoding='utf-8') as file:
+            return file.read().strip()
+    except OSError:
+        return None
+
+
+def cpu_limit():
+    """CPUs available to the process: its affinity capped by the cgroup v2 or v1 CPU quota.
+    :returns: A (cpus, source) tuple.
+    """
+    available = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') \
+        else os.cpu_count() or 1
+    source = 'affinity'
+
+    quota = period = None
+    cpu_max = read_file('/sys/fs/cgroup/cpu.max')
+    if cpu_max:
+        value, _, period_value = cpu_max.partition(' ')
+        if value != 'max':
+            quota, period = int(value), int(period_value or 100000)
+    else:
+        quota_value = read_file('/sys/fs/cgroup/cpu/cpu.cfs_quota_us')
+        period_value = read_file('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+        if quota_value and period_value and int(quota_value) > 0:
+            quota, period = int(quota_value), int(period_value)
+
+    if quota and period and math.ceil(quota / period) < available:
+        available = max(math.ceil(quota / period), 1)
+        source = 'cgroup'
+
+    return available, source
+
+
+def memory_limit():
+    """Memory limit of the cgroup in bytes, None when unlimited."""
+    value = read_file('/sys/fs/cgroup/memory.max') or \
+        read_file('/sys/fs/cgroup/memory/memory.limit_in_bytes')
+    if not value or value == 'max':
+        return None
+
+    limit = int(value)
+    # cgroup v1 reports an unlimited group as a huge page aligned number
+    return limit if limit < 2**60 else None
+
+
+profile_name = os.getenv(
+    'GUNICORN_PROFILE',
+    'production' if os.getenv('FLASK_ENV') == 'production' else 'development')
+profile = PROFILES[profile_name]
+
+cpus, cpus_source = cpu_limit()
+memory = memory_limit()
+
+max_workers = profile['workers_per_cpu'] * cpus + profile['extra_workers']
+if memory:
+    max_workers = min(max_workers, max(memory // WORKER_MEMORY, 1))
 
 bind = f'0.0.0.0:{os.getenv("GUNICORN_PORT", "8000")}'
 accesslog = '-'
 access_log_format = "%(h)s %(l)s %(u)s %(t)s '%(r)s' %(s)s %(b)s '%(f)s' '%(a)s' in %(D)sµs"  # noqa: E501
 
-workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2))
-threads = int(os.getenv('PYTHON_MAX_THREADS', '1'))
+workers = int(os.getenv('WEB_CONCURRENCY', max_workers))
+threads = int(os.getenv('PYTHON_MAX_THREADS', profile['threads']))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS',
+                         'gthread' if threads > 1 else profile['worker_class'])
+
+reload = strtobool(os.getenv('WEB_RELOAD', str(profile['reload'])))
+
+preload_app = strtobool(os.getenv('GUNICORN_PRELOAD', str(profile['preload_app'])))
+
+# Workers are recycled after max_requests, the jitter spreads the restarts
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', profile['max_requests']))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10))
+
+# The app settings (e.g. the connection pool size) read the values chosen here
+os.environ['WEB_CONCURRENCY'] = str(workers)
+os.environ['PYTHON_MAX_THREADS'] = str(threads)
+
+
+def when_ready(server):
+    # With preload_app the app is loaded by now, the objects allocated so far are moved to a
+    # permanent generation so the garbage collector of the workers never touches, and copies,
+    # the memory pages they share with the master
+    if preload_app:
+        gc.freeze()
+
+    report = [
+        ('profile', profile_name),
+        ('cpus', f'{cpus} ({cpus_source})'),
+        ('memory limit', f'{memory // 1024 // 1024}MB' if memory else 'none'),
+        ('workers', workers),
+        ('threads', threads),
+        ('worker class', worker_class),
+        ('preload app', preload_app),
+        ('gc frozen', gc.get_freeze_count() if preload_app else 0),
+        ('reload', reload),
+        ('max requests', f'{max_requests} (jitter {max_requests_jitter})'),
+    ]
+    for name, value in report:
+        server.log.info(f'{name}: {value}')
+
+
+@functools.lru_cache(maxsize=None)
+def flask_metrics():
+    """The flask_metrics module, loaded from its file when the app is not preloaded: importing
+    it from its package would create the app in the master."""
+    module = sys.modules.get('src.app.extensions.flask_metrics')
+    if module is None:
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            'app', 'extensions', 'flask_metrics.py')
+        spec = importlib.util.spec_from_file_location('flask_metrics', path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    return module
+
+
+def metrics_dir() -> str:
+    return os.getenv('METRICS_DIR') or flask_metrics().METRICS_DIR
+
+
+def on_starting(server):  # pylint: disable=unused-argument
+    # Metrics files of a previous run would be summed with the new workers
+    flask_metrics().clear(metrics_dir())
+
+
+def pre_fork(server, worker):  # pylint: disable=unused-argument
+    # Connections opened by the master while preloading the app are closed before forking,
+    # no worker must share a socket with its siblings
+    extensions = sys.modules.get('src.app.extensions')
+    if extensions is not None:
+        extensions.PoolManager.dispose()
+
+
+def post_fork(server, worker):  # pylint: disable=unused-argument
+    extensions = sys.modules.get('src.app.extensions')
+    if extensions is not None:
+        extensions.PoolManager.after_fork()
+        extensions.RequestLogger.after_fork()
+
+
+def worker_exit(server, worker):  # pylint: disable=unused-argument
+    flask_metrics().mark_process_dead(worker.pid, metrics_dir())
+
 
-reload = bool(strtobool(os.getenv('WEB_RELOAD', 'true')))
+def child_exit(server, worker):  # pylint: disable=unused-argument
+    # Workers killed before worker_exit ran, with or without preload_app
+    flask_metrics().mark_process_dead(worker.pid, metrics_dir())
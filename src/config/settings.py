@@ -1,5 +1,6 @@
 import datetime
 import os
+import tempfile
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
@@ -9,6 +10,9 @@ class Config:
 
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'ERROR')
 
+    SECRET_KEY = os.getenv('SECRET_KEY')
+    SECRET_KEY_SALT = os.getenv('SECRET_KEY_SALT')
+
     # SQL Alchemy Settings
     POSTGRES_USER = os.getenv('POSTGRES_USER')
     POSTGRES_PASSWORD = os.getenv('POSTGRES_PASSWORD')
@@ -22,11 +26,111 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = False
 
+    # Connection Pool: sized per worker from the gunicorn workers and threads, gunicorn.py
+    # exports them; flask run and the cli commands are a single process
+    WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+    PYTHON_MAX_THREADS = int(os.getenv('PYTHON_MAX_THREADS', '1'))
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '0'))  # 0 is one connection per thread
+    DB_MAX_CONNECTIONS = int(os.getenv('DB_MAX_CONNECTIONS', '0'))  # all workers, 0 is no limit
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '10'))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+    DB_POOL_PRE_PING = True
+
+    # Read Replicas: comma separated uris, round_robin or least_connections
+    SQLALCHEMY_REPLICA_URIS = [
+        uri.strip() for uri in os.getenv('SQLALCHEMY_REPLICA_URIS', '').split(',') if uri.strip()
+    ]
+    REPLICA_SELECTION = os.getenv('REPLICA_SELECTION', 'round_robin')
+    REPLICA_RETRY_AFTER = int(os.getenv('REPLICA_RETRY_AFTER', '30'))
+
+    # Query Tracker: per request SQL counts and timings, SQL_ENDPOINT_THRESHOLDS by endpoint name
+    SQL_INSTRUMENTATION = True
+    SQL_SERVER_TIMING = True
+    SQL_N_PLUS_ONE = int(os.getenv('SQL_N_PLUS_ONE', '5'))
+    SQL_THRESHOLDS = {
+        'queries': int(os.getenv('SQL_MAX_QUERIES', '50')),
+        'time': float(os.getenv('SQL_MAX_TIME', '0.5')),
+    }
+    SQL_ENDPOINT_THRESHOLDS = {}
+
+    # Request Logger: JSON request logs sampled by status class or by endpoint name
+    LOG_REQUESTS = True
+    LOG_SAMPLE_RATES = {
+        '2xx': float(os.getenv('LOG_SAMPLE_2XX', '0.1')),
+        '3xx': float(os.getenv('LOG_SAMPLE_3XX', '0.1')),
+        '4xx': float(os.getenv('LOG_SAMPLE_4XX', '1')),
+        '5xx': float(os.getenv('LOG_SAMPLE_5XX', '1')),
+    }
+    LOG_ROUTE_SAMPLE_RATES = {}
+    LOG_SLOW_REQUEST = float(os.getenv('LOG_SLOW_REQUEST', '1'))
+    LOG_PAYLOADS = False  # json bodies, with the values of LOG_REDACTED_KEYS masked
+    LOG_PAYLOAD_MAX_SIZE = int(os.getenv('LOG_PAYLOAD_MAX_SIZE', '1024'))
+    LOG_REDACTED_KEYS = ('password', 'token', 'secret', 'authorization', 'api_key', '_profile')
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+
+    # Exception Handler: tracebacks logged per error fingerprint and window
+    ERROR_TRACEBACK_LIMIT = int(os.getenv('ERROR_TRACEBACK_LIMIT', '5'))
+    ERROR_WINDOW = int(os.getenv('ERROR_WINDOW', '60'))
+    ERROR_DIAGNOSTICS_TOKEN = os.getenv('ERROR_DIAGNOSTICS_TOKEN')
+
+    # Metrics: one file per worker in METRICS_DIR, summed by the /metrics route
+    METRICS = True
+    METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'flask-metrics'))
+    METRICS_ROUTE = '/metrics'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+    # Admission Control: 503 for requests queued past the deadline since the proxy's
+    # X-Request-Start or over the in flight limit of the worker (0 is no limit),
+    # ADMISSION_ROUTE_PRIORITIES by endpoint name: critical, normal or low
+    ADMISSION_CONTROL = True
+    ADMISSION_QUEUE_DEADLINE = float(os.getenv('ADMISSION_QUEUE_DEADLINE', '10'))
+    ADMISSION_MAX_IN_FLIGHT = int(os.getenv('ADMISSION_MAX_IN_FLIGHT', '0'))
+    ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', '1'))
+    ADMISSION_ROUTE_PRIORITIES = {}
+
+    # Request Profiler: requests with a `flask profile-token` token, or a share of them, profiled
+    PROFILER_ENABLED = False
+    PROFILER_SAMPLE_RATE = float(os.getenv('PROFILER_SAMPLE_RATE', '0'))
+    PROFILER_DIR = os.getenv('PROFILER_DIR', os.path.join(tempfile.gettempdir(), 'flask-profiles'))
+    PROFILER_MAX_FILES = int(os.getenv('PROFILER_MAX_FILES', '100'))
+
+    # Keyset Pagination
+    KEYSET_CURSOR_EXPIRATION = int(os.getenv('KEYSET_CURSOR_EXPIRATION', str(24 * 3600)))
+    KEYSET_TOTAL_CACHE_TTL = int(os.getenv('KEYSET_TOTAL_CACHE_TTL', '60'))
+
+    # Query Cache: memory (per worker) or sqlite (shared by the workers of a host)
+    QUERY_CACHE_BACKEND = os.getenv('QUERY_CACHE_BACKEND', 'memory')
+    QUERY_CACHE_PATH = os.getenv('QUERY_CACHE_PATH', '/dev/shm/query-cache.sqlite')
+    QUERY_CACHE_TTL = int(os.getenv('QUERY_CACHE_TTL', '60'))
+    QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', '1024'))
+
     # Json Web Tokens
     JWT_ACCESS_TOKEN_EXPIRES = datetime.timedelta(hours=2)
     JWT_REFRESH_TOKEN_EXPIRES = datetime.timedelta(days=30)
     JWT_ERROR_MESSAGE_KEY = 'description'
 
+    # Json Encoder: auto, orjson or json
+    JSON_ENCODER_BACKEND = os.getenv('JSON_ENCODER_BACKEND', 'auto')
+
+    # Response Manager: strong, weak or empty to disable etags
+    RESPONSE_ETAG = os.getenv('RESPONSE_ETAG', 'strong')
+    RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '512'))
+
+    # Schema Manager
+    SCHEMAS_MODULE = os.getenv('SCHEMAS_MODULE', 'src.app.schemas')
+    SCHEMA_CACHE_SIZE = int(os.getenv('SCHEMA_CACHE_SIZE', '256'))
+    BULK_LOAD_BATCH_SIZE = int(os.getenv('BULK_LOAD_BATCH_SIZE', '1000'))
+
+    # Compressor
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '500'))
+    COMPRESS_STATIC = True
+    STATIC_MAX_AGE = 365 * 24 * 3600
+    STATIC_UNVERSIONED_MAX_AGE = int(os.getenv('STATIC_UNVERSIONED_MAX_AGE', '3600'))
+
+    # Validator Engine
+    VALIDATOR_MAX_BODY_SIZE = int(os.getenv('VALIDATOR_MAX_BODY_SIZE', str(1024 * 1024)))
+    VALIDATOR_MAX_DEPTH = int(os.getenv('VALIDATOR_MAX_DEPTH', '32'))
+
 class DevelopmentConfig(Config):
     FLASK_ENV = 'development'
     DEBUG = True
@@ -39,6 +143,13 @@ class DevelopmentConfig(Config):
     # Flask Cors
     CORS_ORIGINS = '*'
 
+    # Request Logger
+    LOG_SAMPLE_RATES = {'2xx': 1.0, '3xx': 1.0, '4xx': 1.0, '5xx': 1.0}
+    LOG_PAYLOADS = True
+
+    # Request Profiler
+    PROFILER_ENABLED = True
+
 
 class TestingConfig(Config):
     FLASK_ENV = 'testing'
@@ -49,6 +160,9 @@ class TestingConfig(Config):
 class ProductionConfig(Config):
     FLASK_ENV = 'production'
 
+    # Database timings are not disclosed to clients
+    SQL_SERVER_TIMING = False
+
 
 config_by_name = dict(
     development=DevelopmentConfig,
@@ -0,0 +1,23 @@
+import pytest
+from flask import Flask, g
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from src.app.extensions.flask_query_tracker import START_KEY, QueryTracker
+
+
+def test_failed_statement_does_not_leave_its_start_time():
+    app = Flask(__name__)
+    QueryTracker(app)
+    engine = create_engine('sqlite://')
+
+    with app.test_request_context('/'), engine.connect() as connection:
+        app.preprocess_request()
+
+        with pytest.raises(OperationalError):
+            connection.execute(text('SELECT * FROM missing_table'))
+        assert not connection.info.get(START_KEY)
+
+        connection.execute(text('SELECT 1'))
+        assert not connection.info.get(START_KEY)
+        assert g.sql_queries.count == 1
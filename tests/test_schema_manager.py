@@ -0,0 +1,68 @@
+import threading
+
+from marshmallow import fields
+from marshmallow_sqlalchemy import SQLAlchemyAutoSchema
+from sqlalchemy import Column, Integer, String, create_engine
+from sqlalchemy.orm import Session, declarative_base
+
+from src.app.extensions.flask_schema_manager import SchemaManager
+
+Base = declarative_base()
+
+session = Session(create_engine('sqlite://'))
+
+# Set while a load of 'A-new' is paused inside the schema
+entered = threading.Event()
+release = threading.Event()
+
+
+class User(Base):
+    __tablename__ = 'users'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+
+
+class PausingString(fields.String):
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        if value == 'A-new':
+            entered.set()
+            release.wait(5)
+        return super()._deserialize(value, attr, data, **kwargs)
+
+
+class UserSchema(SQLAlchemyAutoSchema):
+
+    class Meta:
+        model = User
+        load_instance = True
+        sqla_session = session
+
+    name = PausingString()
+
+
+def test_instance_load_does_not_leak_into_a_concurrent_load():
+    Base.metadata.create_all(session.get_bind())
+    manager = SchemaManager()
+    manager.schemas_module = __name__
+    user = User(id=1, name='A')
+    results = {}
+
+    def load_instance():
+        results['a'] = manager.load({'name': 'A-new'}, name='User', instance=user)
+
+    thread = threading.Thread(target=load_instance)
+    thread.start()
+    assert entered.wait(5)
+
+    try:
+        results['b'] = manager.load({'name': 'B-new'}, name='User')
+    finally:
+        release.set()
+        thread.join()
+
+    assert results['a'] is user
+    assert user.name == 'A-new'
+    assert results['b'] is not user
+    assert results['b'].name == 'B-new'
@@ -0,0 +1,54 @@
+import pytest
+
+from src.app.extensions.flask_validator_engine import compile_rules
+
+
+@pytest.mark.parametrize('rule', [
+    'max',
+    'max:',
+    'min:x',
+    'list:',
+    'regex',
+    'regex:(',
+    'date',
+    'date_after:%Y',
+    'email:x',
+])
+def test_malformed_rules_fail_when_compiled(rule):
+    with pytest.raises(Exception, match='ArgumentError'):
+        compile_rules({'field': [rule]})
+
+
+@pytest.mark.parametrize('rule', ['mro', '__init__', 'unknown'])
+def test_only_validators_are_rules(rule):
+    with pytest.raises(Exception, match='Built-in validator specified not known'):
+        compile_rules({'field': [rule]})
+
+
+def test_rules_with_their_arguments_compile():
+    plan = compile_rules({
+        'name': ['required', 'max:10', 'min:2', r'regex:[a-z]+'],
+        'tags': ['list', 'list:2'],
+        'born': ['date_after:%Y/%m/%d,2000/01/01'],
+    })
+
+    assert plan.run({'name': 'abc', 'tags': ['a', 'b'], 'born': '2020/01/01'}) == {}
+    assert set(plan.run({'name': 'a', 'tags': ['a'], 'born': '1990/01/01'})) == {
+        'name', 'tags', 'born'
+    }
+
+
+@pytest.mark.parametrize('rule', ['date:%Y/%m/%d', 'date_after:%Y/%m/%d,2000/01/01'])
+def test_many_marks_missing_and_non_string_dates(rule):
+    plan = compile_rules({'born': [rule]}, many=True)
+
+    errors = plan.run_many([
+        {'born': '2020/01/01'},
+        {},
+        {'born': ['2020/01/01']},
+        {'born': {'year': 2020}},
+        {'born': '2020/01/01'},
+    ])
+
+    assert sorted(errors) == [1, 2, 3]
+    assert all(set(item) == {'born'} for item in errors.values())